@@ -0,0 +1,165 @@
+"""
+Bitset-indexed teacher availability.
+
+Busy time is stored per teacher as one integer bitmask per school day, where
+bit ``i`` is set when the teacher is busy during the ``i``-th period of the
+day template in ``TimetableData.periods``. Conflict checks are a shift and a
+mask, merges are a bitwise OR, and the masks serialise to plain JSON.
+"""
+
+from intervals import IntervalIndex
+from utils import parse_clock_time
+
+
+def clock_minutes(text):
+    """Minutes after midnight of a clock time, or None when it is missing or unparseable"""
+    try:
+        return parse_clock_time(text) if text else None
+    except (TypeError, ValueError):
+        return None
+
+
+class SlotIndex:
+    """Maps days and period times of the school's day template to bit positions"""
+
+    def __init__(self, days, periods):
+        self.days = list(days)
+        self.day_positions = {day: index for index, day in enumerate(self.days)}
+        self.periods = [(period['start'], period['end']) for period in periods]
+        self.period_positions = {}
+        self.start_positions = {}
+        for index, (start, end) in enumerate(self.periods):
+            self.period_positions.setdefault((start, end), index)
+            self.start_positions.setdefault(start, index)
+
+        # Each period's times parsed once, so "07:30" finds the "07:30 AM" period
+        self.minutes = []
+        self.minute_positions = {}
+        self.start_minute_positions = {}
+        for index, (start, end) in enumerate(self.periods):
+            span = (clock_minutes(start), clock_minutes(end))
+            self.minutes.append(span)
+            if None not in span:
+                self.minute_positions.setdefault(span, index)
+                self.start_minute_positions.setdefault(span[0], index)
+        self.intervals = IntervalIndex(
+            (start, end, index) for index, (start, end) in enumerate(self.minutes)
+            if None not in (start, end) and end > start
+        )
+
+    @classmethod
+    def from_timetable_data(cls, timetable_data):
+        """Build the index from extracted TimetableData (as a dict)"""
+        return cls(timetable_data['days'], timetable_data['periods'])
+
+    def period_position(self, start, end):
+        """Return the period index for a start/end pair, matching on start time as a fallback"""
+        position = self.period_positions.get((start, end))
+        if position is None:
+            position = self.start_positions.get(start)
+        if position is None:
+            # The same times written differently, e.g. "15:50" for "03:50 PM"
+            start_minute, end_minute = clock_minutes(start), clock_minutes(end)
+            position = self.minute_positions.get((start_minute, end_minute))
+            if position is None:
+                position = self.start_minute_positions.get(start_minute)
+        return position
+
+    def busy_positions(self, start, end):
+        """Return every period index a lesson from start to end occupies
+
+        A lesson on the grid occupies its own period. One that is not, such as a
+        35-minute lesson against 40-minute periods, occupies every period its
+        minutes overlap. Unparseable times fall back to period_position.
+        """
+        position = self.period_positions.get((start, end))
+        if position is not None:
+            return [position]
+        start_minute, end_minute = clock_minutes(start), clock_minutes(end)
+        if start_minute is None or end_minute is None or end_minute <= start_minute:
+            position = self.period_position(start, end)
+            return [] if position is None else [position]
+        return [index for _, _, index in self.intervals.overlapping(start_minute, end_minute)]
+
+    def describe(self, day, position):
+        """Format a slot the way busy times used to be written, e.g. "Monday 08:00 AM-08:40 AM\""""
+        start, end = self.periods[position]
+        return f"{day} {start}-{end}"
+
+    def empty_masks(self):
+        """Return a fresh all-free mask list, one entry per day"""
+        return [0] * len(self.days)
+
+
+class TeacherAvailability:
+    """Query and update per-teacher busy bitmasks
+
+    Args:
+        index (SlotIndex): Slot layout the masks refer to
+        masks (dict): Teacher -> list of per-day busy bitmasks; updated in place
+    """
+
+    def __init__(self, index, masks=None):
+        self.index = index
+        self.masks = masks if masks is not None else {}
+
+    def is_free(self, teacher, day, slot):
+        """Return True when the teacher has nothing scheduled in period `slot` on `day`"""
+        masks = self.masks.get(teacher)
+        if not masks:
+            return True
+        return not (masks[self.index.day_positions[day]] >> slot) & 1
+
+    def mark_busy(self, teacher, day, slot):
+        """Record the teacher as busy in period `slot` on `day`"""
+        masks = self.masks.setdefault(teacher, self.index.empty_masks())
+        masks[self.index.day_positions[day]] |= 1 << slot
+
+    def merge(self, other_masks):
+        """Union another teacher -> masks mapping into this one"""
+        self.masks = merge_masks(self.masks, other_masks)
+        return self
+
+    def busy_slots(self, teacher):
+        """Yield (day, slot) pairs where the teacher is busy"""
+        for day, mask in zip(self.index.days, self.masks.get(teacher) or []):
+            slot = 0
+            while mask:
+                if mask & 1:
+                    yield day, slot
+                mask >>= 1
+                slot += 1
+
+    def to_prompt(self, teachers=None):
+        """Compact prompt encoding: teacher -> {day: [busy period_no, ...]} with 1-based period numbers"""
+        encoded = {}
+        for teacher in self.masks:
+            if teachers is not None and teacher not in teachers:
+                continue
+            days = {}
+            for day, slot in self.busy_slots(teacher):
+                days.setdefault(day, []).append(slot + 1)
+            if days:
+                encoded[teacher] = days
+        return encoded
+
+    @classmethod
+    def from_prompt(cls, index, encoded):
+        """Rebuild availability from the to_prompt() encoding"""
+        availability = cls(index)
+        for teacher, days in encoded.items():
+            for day, period_numbers in days.items():
+                for period_no in period_numbers:
+                    availability.mark_busy(teacher, day, period_no - 1)
+        return availability
+
+
+def merge_masks(current, update):
+    """Bitwise-OR two teacher -> per-day masks mappings into a new mapping"""
+    merged = {teacher: list(masks) for teacher, masks in (current or {}).items()}
+    for teacher, masks in (update or {}).items():
+        if teacher in merged:
+            merged[teacher] = [left | right for left, right in zip(merged[teacher], masks)]
+        else:
+            merged[teacher] = list(masks)
+    return merged
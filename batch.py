@@ -0,0 +1,211 @@
+"""
+Batch timetable generation for many schools.
+
+Every school description is run through the async graph with run_timetable's
+bounded job pool, so all schools share one process-wide LLM response cache and
+one rate limiter per provider. Each school's files are written to its own
+subdirectory of the output root, and an aggregate throughput report is printed
+and saved as batch_report.json once every school has finished.
+
+Usage:
+    python batch.py schools/                  # one .txt or .md description per school
+    python batch.py schools.jsonl --workers 8 # {"name": ..., "prompt": ...} per line
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import main
+from llm_cache import get_cache
+from niceterminalui import (
+    console, print_banner, print_info, print_error, print_result_box, print_table, print_completion_message
+)
+from tracing import get_tracer, TABLE_HEADERS
+from utils import safe_filename
+
+PROMPT_EXTENSIONS = (".txt", ".md")
+
+
+def load_schools(source: str) -> list[tuple[str, str]]:
+    """Read (name, prompt) pairs from a directory of descriptions or a JSONL file
+
+    Args:
+        source (str): Directory of .txt/.md files named after their school, or a JSONL
+            file with a "prompt" (or "input") and an optional "name" per line
+
+    Returns:
+        list: (school name, prompt) pairs in file order
+    """
+    schools = []
+    if os.path.isdir(source):
+        for file_name in sorted(os.listdir(source)):
+            stem, extension = os.path.splitext(file_name)
+            if extension.lower() in PROMPT_EXTENSIONS:
+                with open(os.path.join(source, file_name), encoding="utf-8") as file:
+                    schools.append((stem, file.read()))
+        return schools
+
+    with open(source, encoding="utf-8") as file:
+        for line_no, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            prompt = record.get("prompt") or record.get("input")
+            if not prompt:
+                raise ValueError(f"{source}:{line_no} has no prompt")
+            schools.append((record.get("name") or f"school_{line_no}", prompt))
+    return schools
+
+
+def school_output_dirs(schools: list, output_root: str) -> list[str]:
+    """One subdirectory of output_root per school, made unique when names collide"""
+    seen = set()
+    output_dirs = []
+    for name, _ in schools:
+        stem = safe_filename(name)
+        candidate, suffix = stem, 2
+        while candidate in seen:
+            candidate, suffix = f"{stem}_{suffix}", suffix + 1
+        seen.add(candidate)
+        output_dirs.append(os.path.join(output_root, candidate))
+    return output_dirs
+
+
+async def run_school(name: str, prompt: str, output_dir: str, **options) -> dict:
+    """Run one school through the async graph and summarise how it went"""
+    async with main.get_job_semaphore():
+        started = time.perf_counter()
+        try:
+            state = await main.async_graph.ainvoke({"input": prompt, "output_dir": output_dir, **options})
+        except Exception as e:
+            return {'school': name, 'status': "failed", 'error': f"{type(e).__name__}: {e}",
+                    'classes': 0, 'violations': 0, 'seconds': time.perf_counter() - started, 'output_dir': output_dir}
+
+    if not state.get('validated'):
+        status, error = "invalid", "Missing " + ", ".join(state.get('validation_errors') or [])
+    else:
+        status, error = "complete", None
+    return {
+        'school': name,
+        'status': status,
+        'error': error,
+        'classes': len(state.get('class_timetables') or {}),
+        'violations': len(state.get('timetable_violations') or []),
+        'seconds': time.perf_counter() - started,
+        'output_dir': output_dir
+    }
+
+
+async def run_batch(schools: list, output_root: str, **options) -> list[dict]:
+    """Run every school concurrently, limited by MAX_CONCURRENT_JOBS"""
+    output_dirs = school_output_dirs(schools, output_root)
+    return await asyncio.gather(*(
+        run_school(name, prompt, output_dir, **options)
+        for (name, prompt), output_dir in zip(schools, output_dirs)
+    ))
+
+
+def throughput_report(results: list, wall_seconds: float) -> dict:
+    """Aggregate schools/minute, classes/minute, LLM calls, tokens and cache use over the batch"""
+    totals = {'llm_calls': 0, 'retries': 0, 'input_tokens': 0, 'output_tokens': 0}
+    for node_totals in get_tracer().summary().values():
+        for counter in totals:
+            totals[counter] += node_totals[counter]
+    completed = [result for result in results if result['status'] == "complete"]
+    classes = sum(result['classes'] for result in completed)
+    cache_stats = get_cache().stats()
+    return {
+        'schools': len(results),
+        'completed': len(completed),
+        'failed': len(results) - len(completed),
+        'classes': classes,
+        'wall_seconds': wall_seconds,
+        'schools_per_minute': len(completed) * 60 / wall_seconds if wall_seconds else 0.0,
+        'classes_per_minute': classes * 60 / wall_seconds if wall_seconds else 0.0,
+        'cache_hits': cache_stats['hits'],
+        'cache_misses': cache_stats['misses'],
+        **totals,
+        'results': results
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate timetables for many schools")
+    parser.add_argument("source", help="Directory of .txt/.md school descriptions, or a JSONL file")
+    parser.add_argument("--workers", type=int, default=int(os.getenv("MAX_CONCURRENT_JOBS", "4")),
+                        help="Schools generated at the same time")
+    parser.add_argument("--output-root", default="generated_timetables",
+                        help="Each school's files go to a subdirectory of this directory")
+    parser.add_argument("--engine", choices=["llm", "solver"], help="Override GENERATION_ENGINE")
+    parser.add_argument("--mode", choices=["sequential", "parallel"], help="Override GENERATION_MODE")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only regenerate class groups whose inputs changed since each school's previous run")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk LLM response cache")
+    parser.add_argument("--trace-file", help="Where to export per-node timings (default: <output-root>/batch_trace.json)")
+    parser.add_argument("--verbose", action="store_true", help="Show every school's step-by-step output")
+    args = parser.parse_args()
+
+    schools = load_schools(args.source)
+    if not schools:
+        print_error(f"No school descriptions found in {args.source}")
+        raise SystemExit(1)
+
+    llm_cache = get_cache()
+    if args.no_cache:
+        llm_cache.enabled = False
+    # run_timetable's job semaphore is sized from MAX_CONCURRENT_JOBS when the loop first uses it
+    os.environ["MAX_CONCURRENT_JOBS"] = str(args.workers)
+
+    print_banner(
+        title="SKEJUL-AI BATCH",
+        subtitle="AI-Powered Timetable Generator",
+        description=f"{len(schools)} schools from {args.source}",
+        subheader1=f"{args.workers} schools at a time",
+        subheader2=f"Writing to {args.output_root}/<school>/"
+    )
+
+    options = {"generation_engine": args.engine, "generation_mode": args.mode, "incremental": args.incremental or None}
+    tracer = get_tracer()
+    tracer.reset()
+    console.quiet = not args.verbose
+    start = time.perf_counter()
+    try:
+        results = asyncio.run(run_batch(schools, args.output_root, **options))
+    finally:
+        console.quiet = False
+    report = throughput_report(results, time.perf_counter() - start)
+
+    print_table(
+        "Schools",
+        ["School", "Status", "Classes", "Violations", "Time (s)", "Output"],
+        [[result['school'], result['error'] or result['status'], result['classes'], result['violations'],
+          f"{result['seconds']:.1f}", result['output_dir']] for result in results]
+    )
+    print_result_box(
+        "Batch Throughput",
+        f"Schools: {report['completed']} complete / {report['failed']} failed\n"
+        f"Classes Generated: {report['classes']}\n"
+        f"Wall Time: {report['wall_seconds']:.1f}s\n"
+        f"Schools/minute: {report['schools_per_minute']:.1f}\n"
+        f"Classes/minute: {report['classes_per_minute']:.1f}\n"
+        f"LLM Calls: {report['llm_calls']} ({report['retries']} retries)\n"
+        f"Tokens In / Out: {report['input_tokens']} / {report['output_tokens']}\n"
+        f"LLM Cache: {report['cache_hits']} hits / {report['cache_misses']} misses"
+        + ("" if llm_cache.enabled else " (bypassed)")
+    )
+
+    os.makedirs(args.output_root, exist_ok=True)
+    report_path = os.path.join(args.output_root, "batch_report.json")
+    with open(report_path, "w", encoding="utf-8") as file:
+        json.dump(report, file, indent=2)
+    trace_file = args.trace_file or os.path.join(args.output_root, "batch_trace.json")
+    tracer.export(trace_file)
+    print_table("Run Trace", TABLE_HEADERS, tracer.table_rows())
+    print_info(f"Report written to {report_path}, trace to {trace_file}")
+
+    print_completion_message("Skejul-AI", "Your Intelligent Scheduling Assistant")
+    if report['failed']:
+        raise SystemExit(1)
@@ -0,0 +1,656 @@
+"""
+Offline performance benchmarks for Skejul-AI.
+
+Every benchmark swaps the chat models for the deterministic stand-ins in
+fake_llm.py, so no API calls are made.
+
+Usage:
+    python benchmark.py graph --classes 5 20 50 --latency 0.05
+    python benchmark.py async --jobs 8 --latency 1.0
+    python benchmark.py dataframes --classes 10 100 200
+    python benchmark.py schedule --classes 50 200 500
+    python benchmark.py prompt --classes 10 50 100
+    python benchmark.py excel --classes 10 100
+    python benchmark.py render --classes 24 --dpi 300
+    python benchmark.py importtime --budget-ms 1500
+    python benchmark.py solver --classes 10 --classes-per-teacher 3 10
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import pandas as pd
+
+import main
+from availability import SlotIndex, TeacherAvailability, merge_masks
+from fake_llm import StubChatModel, load_recording, synthetic_school
+from llm_cache import get_cache
+from niceterminalui import console, print_banner, print_table
+from schedule import Schedule
+from solver import solve_class_group
+from tracing import get_tracer
+from utils import parse_clock_time
+
+
+def install_stub_models(timetable_data, latency, recorded=None):
+    """Swap the workflow's model factories for stub models and bypass the LLM cache"""
+    get_cache().enabled = False
+    main.create_structured_llm = lambda: StubChatModel(timetable_data, latency, recorded)
+    main.create_llm = lambda: StubChatModel(timetable_data, latency, recorded)
+    main.structured_llm = None
+    main.llm = None
+
+
+def solve_school(timetable_data):
+    """Schedule every class group of a school with the local solver"""
+    class_timetables = {}
+    teacher_availability = {}
+    for class_group in timetable_data['class_groups']:
+        schedule = main.solver_generate_class_group(class_group['name'], timetable_data, teacher_availability)
+        class_timetables[class_group['name']] = schedule
+        teacher_availability = merge_masks(
+            teacher_availability, main.collect_teacher_busy_times(schedule, timetable_data)
+        )
+    return class_timetables
+
+
+def legacy_convert_to_dataframes(class_timetables):
+    """Cell-by-cell conversion used before build_timetable_frames, kept as the baseline"""
+    time_slots_set = set()
+    for class_data in class_timetables.values():
+        for day_periods in class_data.values():
+            for period in day_periods:
+                time_slots_set.add(f"{period['start']} - {period['end']}")
+
+    def time_key(time_range):
+        return datetime.strptime(time_range.split(" - ")[0], "%I:%M %p")
+
+    sorted_time_slots = sorted(time_slots_set, key=time_key)
+    frames = {}
+    for class_name, days_data in class_timetables.items():
+        df = pd.DataFrame(index=["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"],
+                          columns=sorted_time_slots)
+        for day, periods in days_data.items():
+            for period in periods:
+                value = period["subject"]["name"] if period["subject"] else period["type"].capitalize()
+                df.loc[day, f"{period['start']} - {period['end']}"] = value
+        df.fillna("", inplace=True)
+        frames[class_name] = df
+    return frames
+
+
+def benchmark_dataframes(args):
+    """Time DataFrame conversion of synthetic schools against the legacy implementation"""
+    rows = []
+    for n_classes in args.classes:
+        timetable_data = synthetic_school(n_classes=n_classes)
+        console.quiet = True
+        class_timetables = solve_school(timetable_data)
+        console.quiet = False
+
+        start = time.perf_counter()
+        legacy = legacy_convert_to_dataframes(class_timetables)
+        legacy_seconds = time.perf_counter() - start
+
+        parse_clock_time.cache_clear()
+        start = time.perf_counter()
+        frames = main.build_timetable_frames(class_timetables, timetable_data)
+        seconds = time.perf_counter() - start
+
+        identical = all(frames[name].equals(legacy[name].astype(object)) for name in legacy)
+        rows.append([
+            n_classes, f"{legacy_seconds * 1000:.1f}", f"{seconds * 1000:.1f}",
+            f"{legacy_seconds / seconds:.1f}x", "yes" if identical else "NO"
+        ])
+
+    print_table(
+        "convert_to_dataframes",
+        ["Classes", "Legacy (ms)", "Vectorised (ms)", "Speedup", "Identical"],
+        rows
+    )
+
+
+def traced_size(build):
+    """Return (result, bytes still allocated by build()) using tracemalloc"""
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = build()
+        return result, tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+
+
+def benchmark_schedule(args):
+    """Memory of the JSON timetables against the array-backed Schedule, and the cost of converting between them"""
+    rows = []
+    for n_classes in args.classes:
+        timetable_data = synthetic_school(n_classes=n_classes)
+        console.quiet = True
+        encoded = json.dumps(solve_school(timetable_data))
+        console.quiet = False
+
+        class_timetables, json_bytes = traced_size(lambda: json.loads(encoded))
+        schedule, schedule_bytes = traced_size(lambda: Schedule.from_class_timetables(class_timetables, timetable_data))
+        start = time.perf_counter()
+        schedule = Schedule.from_class_timetables(class_timetables, timetable_data)
+        pack_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        unpacked = schedule.to_class_timetables()
+        unpack_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        legacy_masks = {}
+        for class_schedule in class_timetables.values():
+            legacy_masks = merge_masks(legacy_masks, main.collect_teacher_busy_times(class_schedule, timetable_data))
+        legacy_mask_seconds = time.perf_counter() - start
+        start = time.perf_counter()
+        masks = schedule.teacher_busy_masks()
+        mask_seconds = time.perf_counter() - start
+
+        identical = unpacked == class_timetables and masks == legacy_masks
+        rows.append([
+            n_classes, f"{json_bytes / 1024:.0f}", f"{schedule_bytes / 1024:.0f}", f"{json_bytes / schedule_bytes:.0f}x",
+            f"{pack_seconds * 1000:.1f} / {unpack_seconds * 1000:.1f}",
+            f"{legacy_mask_seconds * 1000:.1f} / {mask_seconds * 1000:.1f}", "yes" if identical else "NO"
+        ])
+
+    print_table(
+        "JSON timetables vs Schedule",
+        ["Classes", "JSON (KB)", "Schedule (KB)", "Smaller", "Pack / unpack (ms)", "Busy masks, dicts / array (ms)",
+         "Round trip"],
+        rows
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def token_encoding():
+    """tiktoken's cl100k_base encoding, or None when tiktoken is missing or the encoding can't be loaded offline"""
+    try:
+        import tiktoken
+
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        # A missing package, or an encoding that isn't cached locally and can't be downloaded
+        return None
+
+
+def count_tokens(text):
+    """Count tokens with tiktoken's cl100k_base when it is available, else estimate 4 characters per token"""
+    encoding = token_encoding()
+    if encoding is None:
+        return len(text) // 4
+    return len(encoding.encode(text))
+
+
+def legacy_class_group_payload(class_group_name, timetable_data, teacher_availability):
+    """Indented payload with every teacher's constraints, used before the compact encoding, kept as the baseline"""
+    availability = TeacherAvailability(SlotIndex.from_timetable_data(timetable_data), teacher_availability)
+    return json.dumps({
+        'days': timetable_data['days'],
+        'start_time': timetable_data['start_time'],
+        'end_time': timetable_data['end_time'],
+        'periods': timetable_data['periods'],
+        'class_groups': [main.find_class_group(timetable_data, class_group_name)],
+        'teacher_constraints': availability.to_prompt()
+    }, indent=2)
+
+
+def benchmark_prompt(args):
+    """Compare generation prompt tokens of the legacy and compact encodings and check the stub's schedules match"""
+    rows = []
+    for n_classes in args.classes:
+        timetable_data = synthetic_school(n_classes=n_classes)
+        console.quiet = True
+        reference = solve_school(timetable_data)
+        console.quiet = False
+
+        stub = StubChatModel(timetable_data)
+        teacher_availability = {}
+        legacy_tokens = compact_tokens = 0
+        identical = True
+        for class_group in timetable_data['class_groups']:
+            name = class_group['name']
+            legacy_last = count_tokens(legacy_class_group_payload(name, timetable_data, teacher_availability))
+            messages = main.build_class_group_messages(name, timetable_data, teacher_availability)
+            compact_last = count_tokens(messages[-1].content)
+            legacy_tokens += legacy_last
+            compact_tokens += compact_last
+
+            schedule = json.loads(stub.respond(messages).content)[name]
+            identical = identical and schedule == reference[name]
+            teacher_availability = merge_masks(
+                teacher_availability, main.collect_teacher_busy_times(schedule, timetable_data)
+            )
+
+        rows.append([
+            n_classes, legacy_tokens, compact_tokens, f"{1 - compact_tokens / legacy_tokens:.0%}",
+            f"{legacy_last} / {compact_last}", "yes" if identical else "NO"
+        ])
+
+    print_table(
+        "Generation prompt tokens per school (excluding the system prompt"
+        + ("" if token_encoding() else ", estimated at 4 characters per token") + ")",
+        ["Classes", "Legacy", "Compact", "Reduction", "Last prompt (legacy / compact)", "Identical schedules"],
+        rows
+    )
+
+
+def benchmark_excel(args):
+    """Compare one .xlsx per class against a single multi-sheet workbook"""
+    from create_timetable_workbook import create_timetable_workbook, excel_sheet_name
+
+    rows = []
+    for n_classes in args.classes:
+        timetable_data = synthetic_school(n_classes=n_classes)
+        console.quiet = True
+        class_timetables = solve_school(timetable_data)
+        console.quiet = False
+        frames = main.build_timetable_frames(class_timetables, timetable_data)
+        teacher_frames = main.build_teacher_frames(class_timetables, timetable_data)
+
+        with tempfile.TemporaryDirectory() as output_dir:
+            start = time.perf_counter()
+            for name, df in frames.items():
+                df.to_excel(os.path.join(output_dir, f"{name}.xlsx"), index=True,
+                            sheet_name=excel_sheet_name(name, set()))
+            per_class_seconds = time.perf_counter() - start
+
+            timings = []
+            for write_only in (False, True):
+                start = time.perf_counter()
+                create_timetable_workbook(frames, os.path.join(output_dir, "timetables.xlsx"),
+                                          teacher_frames=teacher_frames, write_only=write_only)
+                timings.append(time.perf_counter() - start)
+
+        rows.append([
+            n_classes, len(teacher_frames), f"{per_class_seconds:.2f}",
+            f"{timings[0]:.2f}", f"{timings[1]:.2f}"
+        ])
+
+    print_table(
+        "Excel export (workbook times include the per-teacher sheets)",
+        ["Classes", "Teachers", "Per-class files (s)", "Workbook (s)", "Write-only workbook (s)"],
+        rows
+    )
+
+
+def _render_mode(mode, frames, output_dir, dpi, workers, queue):
+    """Render every frame in a fresh process and report time and peak RSS"""
+    import resource
+    import matplotlib.pyplot as plt
+    from create_timetable_image import create_timetable_image, draw_timetable, figure_size, render_timetable_images
+
+    jobs = [(df, name, os.path.join(output_dir, f"{mode}_{index}.png")) for index, (name, df) in enumerate(frames.items())]
+    start = time.perf_counter()
+    if mode == "pyplot":
+        # The pre-batch behaviour: a new pyplot figure per class that is never closed
+        for df, name, output_file in jobs:
+            fig = plt.figure(figsize=figure_size(df))
+            draw_timetable(fig, df, name, use_colors=False)
+            fig.savefig(output_file, dpi=dpi, bbox_inches='tight', facecolor='white')
+    elif mode == "per-image":
+        for df, name, output_file in jobs:
+            create_timetable_image(df, name, output_file, use_colors=False, dpi=dpi)
+    else:
+        render_timetable_images(jobs, use_colors=False, dpi=dpi, workers=1 if mode == "batch" else workers)
+    seconds = time.perf_counter() - start
+
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children_kb = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    queue.put((seconds, peak_kb, children_kb))
+
+
+def benchmark_render(args):
+    """Compare per-image time and peak RSS of the image rendering strategies"""
+    timetable_data = synthetic_school(n_classes=args.classes)
+    console.quiet = True
+    frames = main.build_timetable_frames(solve_school(timetable_data), timetable_data)
+    console.quiet = False
+
+    context = multiprocessing.get_context("spawn")
+    rows = []
+    with tempfile.TemporaryDirectory() as output_dir:
+        for mode in ("pyplot", "per-image", "batch", "batch-pool"):
+            queue = context.Queue()
+            process = context.Process(
+                target=_render_mode, args=(mode, frames, output_dir, args.dpi, args.workers, queue)
+            )
+            process.start()
+            seconds, peak_kb, children_kb = queue.get()
+            process.join()
+            rows.append([
+                mode, f"{seconds:.2f}", f"{seconds * 1000 / len(frames):.0f}",
+                f"{peak_kb / 1024:.0f}", f"{children_kb / 1024:.0f}" if mode == "batch-pool" else "-"
+            ])
+
+    print_table(
+        f"Rendering {len(frames)} timetables at {args.dpi} dpi",
+        ["Mode", "Total (s)", "Per image (ms)", "Peak RSS (MB)", "Worker peak RSS (MB)"],
+        rows
+    )
+
+
+def _run_graph(timetable_data, recorded, options, output_dir, latency, queue):
+    """Run graph.invoke end-to-end in a fresh process and report node timings, peak RSS and file sizes"""
+    import resource
+
+    install_stub_models(timetable_data, latency, recorded)
+    console.quiet = True
+
+    tracer = get_tracer()
+    tracer.reset()
+    start = time.perf_counter()
+    result = main.graph.invoke({"input": "benchmark school", "output_dir": output_dir, **options})
+    total_seconds = time.perf_counter() - start
+    node_seconds = {node: totals['seconds'] for node, totals in tracer.summary().items()}
+    generated_files = result['generated_files']
+
+    file_bytes = {}
+    for path in generated_files:
+        extension = os.path.splitext(path)[1]
+        file_bytes[extension] = file_bytes.get(extension, 0) + os.path.getsize(path)
+    peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put((total_seconds, node_seconds, peak_kb, file_bytes))
+
+
+def benchmark_graph(args):
+    """Run the whole StateGraph on stub models for schools of increasing size"""
+    if args.recording:
+        recorded_data, recorded = load_recording(args.recording)
+        schools = [(len(recorded_data['class_groups']), recorded_data, recorded)]
+    else:
+        schools = [
+            (n_classes, synthetic_school(n_classes=n_classes, n_days=args.days, periods_per_day=args.periods), None)
+            for n_classes in args.classes
+        ]
+    options = {
+        "generation_engine": args.engine,
+        "generation_mode": args.mode,
+        "excel_output": args.excel_output,
+        "incremental": False
+    }
+
+    context = multiprocessing.get_context("spawn")
+    summary_rows = []
+    node_rows = []
+    with tempfile.TemporaryDirectory() as output_root:
+        for n_classes, timetable_data, recorded in schools:
+            queue = context.Queue()
+            process = context.Process(
+                target=_run_graph,
+                args=(timetable_data, recorded, options, os.path.join(output_root, f"school_{n_classes}"),
+                      args.latency, queue)
+            )
+            process.start()
+            total_seconds, node_seconds, peak_kb, file_bytes = queue.get()
+            process.join()
+
+            teachers = {subject['teacher'] for class_group in timetable_data['class_groups']
+                        for subject in class_group['subjects']}
+            summary_rows.append([
+                n_classes, len(teachers), f"{total_seconds:.2f}", f"{peak_kb / 1024:.0f}",
+                ", ".join(f"{extension} {size / 1024:.0f} KB" for extension, size in sorted(file_bytes.items()))
+            ])
+            for node, seconds in sorted(node_seconds.items(), key=lambda item: -item[1]):
+                node_rows.append([n_classes, node, f"{seconds * 1000:.0f}", f"{seconds * 100 / total_seconds:.0f}%"])
+
+    print_table(
+        f"graph.invoke end-to-end ({args.engine}, {args.mode}, {args.latency}s stub latency)",
+        ["Classes", "Teachers", "Total (s)", "Peak RSS (MB)", "Output files"],
+        summary_rows
+    )
+    print_table("Time per node", ["Classes", "Node", "Time (ms)", "Share"], node_rows)
+
+
+# Modules that must only be loaded by the nodes that use them, never by "import main"
+DEFERRED_MODULES = ("pandas", "matplotlib", "openpyxl", "langchain_groq", "langchain.chat_models")
+
+
+def measure_import(module):
+    """Import a module in a fresh interpreter and return its cumulative import time (ms) and deferred modules loaded"""
+    code = (
+        f"import sys, {module}; "
+        f"print(','.join(name for name in {DEFERRED_MODULES!r} if name in sys.modules))"
+    )
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True, text=True, check=True
+    )
+
+    # -X importtime writes "import time: self [us] | cumulative | imported package" lines to stderr
+    cumulative_us = 0
+    for line in completed.stderr.splitlines():
+        if line.startswith("import time:"):
+            fields = [field.strip() for field in line[len("import time:"):].split("|")]
+            if fields[2] == module:
+                cumulative_us = int(fields[1])
+    loaded = [name for name in completed.stdout.strip().split(",") if name]
+    return cumulative_us / 1000, loaded
+
+
+def benchmark_importtime(args):
+    """Check that importing the workflow stays within its import-time budget"""
+    rows = []
+    failed = False
+    for module in args.modules:
+        best_ms, loaded = min(measure_import(module) for _ in range(args.repeat))
+        within_budget = best_ms <= args.budget_ms and not loaded
+        failed = failed or not within_budget
+        rows.append([
+            module, f"{best_ms:.0f}", f"{args.budget_ms:.0f}",
+            ", ".join(loaded) or "-", "yes" if within_budget else "NO"
+        ])
+
+    print_table(
+        f"Import time (best of {args.repeat}, python -X importtime)",
+        ["Module", "Import (ms)", "Budget (ms)", "Deferred modules loaded", "Within budget"],
+        rows
+    )
+    if failed:
+        sys.exit(1)
+
+
+def tight_teacher_school():
+    """Two days of two class periods where Eng's teacher is free for only one of the four"""
+    periods = [
+        {"type": "class", "start": "08:00 AM", "end": "08:40 AM"},
+        {"type": "class", "start": "08:40 AM", "end": "09:20 AM"}
+    ]
+    timetable_data = {
+        "days": ["Monday", "Tuesday"],
+        "periods": periods,
+        "class_groups": [{"name": "Class 1", "subjects": [
+            {"name": "Math", "teacher": "Teacher A", "slots_per_week": 2},
+            {"name": "Eng", "teacher": "Teacher B", "slots_per_week": 2}
+        ]}]
+    }
+    busy = {"Teacher B": [("Monday", 0), ("Monday", 1), ("Tuesday", 0)]}
+    return timetable_data, busy
+
+
+def check_solver_school(timetable_data, busy=None):
+    """Solve every class group and count lessons placed, left unplaced, missed and double-booked.
+
+    A missed placement is an empty class period where a subject with unplaced
+    lessons could have gone because its teacher was free.
+    """
+    availability = TeacherAvailability(SlotIndex.from_timetable_data(timetable_data))
+    for teacher, slots in (busy or {}).items():
+        for day, index in slots:
+            availability.mark_busy(teacher, day, index)
+
+    placed = unplaced_total = missed = clashes = 0
+    for class_group in timetable_data['class_groups']:
+        schedule, unplaced = solve_class_group(
+            class_group, timetable_data['days'], timetable_data['periods'], availability
+        )
+        unplaced_total += sum(unplaced.values())
+        teachers = {subject['name']: subject.get('teacher') for subject in class_group['subjects']}
+        for day, periods in schedule.items():
+            for index, period in enumerate(periods):
+                if period['type'] != 'class':
+                    continue
+                if period['subject'] is None:
+                    missed += any(
+                        availability.is_free(teachers[name], day, index) for name in unplaced
+                    )
+                    continue
+                placed += 1
+                teacher = period['subject']['teacher_name']
+                clashes += not availability.is_free(teacher, day, index)
+                availability.mark_busy(teacher, day, index)
+    return placed, unplaced_total, missed, clashes
+
+
+def benchmark_solver(args):
+    """Check that the solver fills every period it can when teachers are over-subscribed"""
+    schools = [("Tight teacher", *tight_teacher_school())]
+    for classes_per_teacher in args.classes_per_teacher:
+        schools.append((
+            f"{args.classes} classes, {classes_per_teacher} per teacher",
+            synthetic_school(n_classes=args.classes, classes_per_teacher=classes_per_teacher),
+            None
+        ))
+
+    rows = []
+    failed = False
+    console.quiet = True
+    try:
+        for name, timetable_data, busy in schools:
+            start = time.perf_counter()
+            placed, unplaced, missed, clashes = check_solver_school(timetable_data, busy)
+            elapsed = time.perf_counter() - start
+            passed = not missed and not clashes
+            failed = failed or not passed
+            rows.append([
+                name, str(placed), str(unplaced), str(missed), str(clashes),
+                f"{elapsed * 1000:.0f}", "yes" if passed else "NO"
+            ])
+    finally:
+        console.quiet = False
+
+    print_table(
+        "Solver placement on over-subscribed teachers",
+        ["School", "Lessons placed", "Unplaced", "Missed placements", "Clashes", "Time (ms)", "Passed"],
+        rows
+    )
+    if failed:
+        sys.exit(1)
+
+
+def benchmark_async(args):
+    """Compare jobs/minute of sequential graph.invoke against concurrent run_timetable"""
+    install_stub_models(synthetic_school(n_classes=args.classes), args.latency)
+    os.environ["MAX_CONCURRENT_JOBS"] = str(args.concurrency)
+
+    with tempfile.TemporaryDirectory() as output_root:
+        def job_options(job):
+            return {
+                "generation_engine": "llm",
+                "output_dir": os.path.join(output_root, f"job_{job}")
+            }
+
+        console.quiet = True
+        start = time.perf_counter()
+        for job in range(args.jobs):
+            main.graph.invoke({"input": f"school {job}", **job_options(job)})
+        sync_seconds = time.perf_counter() - start
+
+        async def run_all():
+            await asyncio.gather(*(
+                main.run_timetable(f"school {job}", **job_options(job)) for job in range(args.jobs)
+            ))
+
+        start = time.perf_counter()
+        asyncio.run(run_all())
+        async_seconds = time.perf_counter() - start
+        console.quiet = False
+
+    print_table(
+        f"Sync vs async ({args.jobs} jobs, {args.classes} classes, {args.latency}s stub latency)",
+        ["Path", "Total (s)", "Jobs/minute"],
+        [
+            ["graph.invoke (sync)", f"{sync_seconds:.2f}", f"{args.jobs * 60 / sync_seconds:.1f}"],
+            [f"run_timetable (async, {args.concurrency} slots)", f"{async_seconds:.2f}",
+             f"{args.jobs * 60 / async_seconds:.1f}"]
+        ]
+    )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Offline Skejul-AI benchmarks")
+    subparsers = parser.add_subparsers(dest="benchmark", required=True)
+
+    graph_parser = subparsers.add_parser("graph", help="Whole-graph timings, peak memory and output sizes")
+    graph_parser.add_argument("--classes", type=int, nargs="+", default=[5, 20, 50])
+    graph_parser.add_argument("--days", type=int, default=5)
+    graph_parser.add_argument("--periods", type=int, default=8, help="Class periods per day")
+    graph_parser.add_argument("--latency", type=float, default=0.0, help="Stub model latency in seconds")
+    graph_parser.add_argument("--engine", choices=["llm", "solver"], default="llm")
+    graph_parser.add_argument("--mode", choices=["sequential", "parallel"], default="sequential")
+    graph_parser.add_argument("--excel-output", choices=["per_class", "workbook", "both"], default="per_class")
+    graph_parser.add_argument("--recording", help="Replay a real run saved in this output directory")
+    graph_parser.set_defaults(run=benchmark_graph)
+
+    async_parser = subparsers.add_parser("async", help="Jobs/minute of the sync and async graphs")
+    async_parser.add_argument("--jobs", type=int, default=8)
+    async_parser.add_argument("--classes", type=int, default=3)
+    async_parser.add_argument("--latency", type=float, default=1.0, help="Stub model latency in seconds")
+    async_parser.add_argument("--concurrency", type=int, default=4)
+    async_parser.set_defaults(run=benchmark_async)
+
+    dataframes_parser = subparsers.add_parser("dataframes", help="DataFrame conversion of large synthetic schools")
+    dataframes_parser.add_argument("--classes", type=int, nargs="+", default=[10, 50, 100, 200])
+    dataframes_parser.set_defaults(run=benchmark_dataframes)
+
+    schedule_parser = subparsers.add_parser("schedule", help="Memory and conversion cost of the array-backed Schedule")
+    schedule_parser.add_argument("--classes", type=int, nargs="+", default=[50, 200, 500])
+    schedule_parser.set_defaults(run=benchmark_schedule)
+
+    prompt_parser = subparsers.add_parser("prompt", help="Prompt tokens of the legacy and compact encodings")
+    prompt_parser.add_argument("--classes", type=int, nargs="+", default=[10, 50, 100])
+    prompt_parser.set_defaults(run=benchmark_prompt)
+
+    excel_parser = subparsers.add_parser("excel", help="Per-class .xlsx files vs one multi-sheet workbook")
+    excel_parser.add_argument("--classes", type=int, nargs="+", default=[10, 50, 100])
+    excel_parser.set_defaults(run=benchmark_excel)
+
+    render_parser = subparsers.add_parser("render", help="Image rendering time and peak memory")
+    render_parser.add_argument("--classes", type=int, default=24)
+    render_parser.add_argument("--dpi", type=int, default=300)
+    render_parser.add_argument("--workers", type=int, default=os.cpu_count())
+    render_parser.set_defaults(run=benchmark_render)
+
+    importtime_parser = subparsers.add_parser("importtime", help="Import-time budget of the workflow modules")
+    importtime_parser.add_argument("--modules", nargs="+", default=["main"])
+    importtime_parser.add_argument("--budget-ms", type=float,
+                                   default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "1500")))
+    importtime_parser.add_argument("--repeat", type=int, default=3)
+    importtime_parser.set_defaults(run=benchmark_importtime)
+
+    solver_parser = subparsers.add_parser("solver", help="Solver placement checks on over-subscribed teachers")
+    solver_parser.add_argument("--classes", type=int, default=10)
+    solver_parser.add_argument("--classes-per-teacher", type=int, nargs="+", default=[3, 10])
+    solver_parser.set_defaults(run=benchmark_solver)
+
+    args = parser.parse_args()
+    print_banner(
+        title="SKEJUL-AI BENCHMARK",
+        subtitle="Offline performance measurements",
+        description="Stub chat models, no API calls",
+        subheader1=f"Benchmark: {args.benchmark}",
+        subheader2="Results are wall-clock times on this machine"
+    )
+    args.run(args)
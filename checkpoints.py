@@ -0,0 +1,46 @@
+"""
+Resumable runs.
+
+The command line compiles the workflow with a local SQLite checkpointer, so
+the state after every completed step is saved under the run's thread id. A
+run that crashes or hits a rate limit part way through the class groups can
+be resumed from its last saved step with ``python main.py --resume <id>``
+instead of starting again from extraction.
+"""
+
+import os
+import sqlite3
+from datetime import datetime
+
+from llm_cache import hash_text
+
+
+def checkpoint_db_path() -> str:
+    """Checkpoint database location, configurable with CHECKPOINT_DB"""
+    return os.getenv("CHECKPOINT_DB", os.path.join(".skejul_cache", "checkpoints.sqlite"))
+
+
+def create_checkpointer(path=None):
+    """Open (or create) the SQLite checkpoint database and return a LangGraph checkpointer"""
+    from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+    from langgraph.checkpoint.sqlite import SqliteSaver
+
+    path = path or checkpoint_db_path()
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # The state holds DataFrames once timetables are converted, which need the pickle fallback
+    return SqliteSaver(
+        sqlite3.connect(path, check_same_thread=False),
+        serde=JsonPlusSerializer(pickle_fallback=True)
+    )
+
+
+def new_thread_id(school_input: str) -> str:
+    """Return a thread id for a new run: the school prompt's hash plus a timestamp"""
+    return f"{hash_text(school_input)[:8]}-{datetime.now().strftime('%Y%m%d%H%M%S')}"
+
+
+def thread_config(thread_id: str) -> dict:
+    """Return the graph config that saves to and resumes from a thread"""
+    return {"configurable": {"thread_id": thread_id}}
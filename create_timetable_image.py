@@ -1,141 +1,162 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
 import pandas as pd
-import matplotlib.pyplot as plt
 import random
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 
 # Global dictionary to store subject colors persistently
 _subject_colors = {}
 
-def create_timetable_image(df, class_name, output_file="timetable.png", use_colors=True):
+# Figure reused by every image rendered in this process during batch rendering
+_batch_figure = None
+
+# Minimum images per worker process before batch rendering uses a process pool
+IMAGES_PER_WORKER = 4
+
+# Fixed colors for special periods
+FIXED_COLORS = {
+    'Assembly': '#FF6B6B',
+    'Break': '#4ECDC4', 
+    'Lunch': '#45B7D1',
+    'Activity': '#96CEB4',
+    'default': '#E8E8E8'
+}
+
+
+def default_dpi():
+    """Image resolution, configurable with TIMETABLE_IMAGE_DPI"""
+    return int(os.getenv("TIMETABLE_IMAGE_DPI", "300"))
+
+
+def generate_random_color():
+    """Generate a random pleasant color"""
+    colors = [
+        '#FFEAA7', '#DDA0DD', "#79B3A5", '#F7DC6F', '#AED6F1',
+        '#F8C471', '#D7BDE2', '#A9DFBF', '#FAD7A0', '#F5B7B1',
+        '#D5A6BD', '#AED6F1', '#A3E4D7', '#F9E79F', '#D2B4DE',
+        '#85C1E9', '#82E0AA', '#F8D7DA', '#D1ECF1', '#FFF3CD',
+        '#E2E3E5', '#D4E6F1', '#D5F4E6', '#FCF3CF', '#FADBD8'
+    ]
+    return random.choice(colors)
+
+
+def get_subject_color(subject):
+    """Get or assign color for a subject"""
+    # Check fixed colors first
+    if subject in FIXED_COLORS:
+        return FIXED_COLORS[subject]
+
+    # Check if we already assigned a color to this subject
+    if subject in _subject_colors:
+        return _subject_colors[subject]
+
+    # Assign new random color
+    color = generate_random_color()
+    _subject_colors[subject] = color
+    return color
+
+
+def abbreviate_subject(subject, max_length=12):
+    """Dynamically abbreviate long subject names intelligently"""
+    if len(subject) <= max_length:
+        return subject
+
+    def shorten_word(word, target_length):
+        """Intelligently shorten a single word"""
+        if len(word) <= target_length:
+            return word
+
+        # Remove vowels (except first letter) while keeping consonants
+        if target_length >= 4:
+            vowels = 'aeiouAEIOU'
+            consonants_only = word[0]  # Keep first letter
+            for char in word[1:]:
+                if char not in vowels:
+                    consonants_only += char
+                if len(consonants_only) >= target_length:
+                    break
+
+            if len(consonants_only) <= target_length:
+                return consonants_only
+
+        # If still too long, truncate and add period
+        return word[:target_length-1] + '.'
+
+    words = subject.split()
+
+    if len(words) == 1:
+        # Single word - use intelligent shortening
+        return shorten_word(words[0], max_length)
+
+    elif len(words) == 2:
+        # Two words - try different strategies
+        word1, word2 = words
+
+        # Strategy 1: Try shortening the longer word
+        if len(word1) > len(word2):
+            shortened_w1 = shorten_word(word1, max_length - len(word2) - 1)
+            result = f"{shortened_w1} {word2}"
+            if len(result) <= max_length:
+                return result
+        else:
+            shortened_w2 = shorten_word(word2, max_length - len(word1) - 1)
+            result = f"{word1} {shortened_w2}"
+            if len(result) <= max_length:
+                return result
+
+        # Strategy 2: Shorten both words proportionally
+        available_chars = max_length - 1  # -1 for space
+        w1_target = min(len(word1), available_chars // 2)
+        w2_target = available_chars - w1_target
+
+        shortened_w1 = shorten_word(word1, w1_target)
+        shortened_w2 = shorten_word(word2, w2_target)
+
+        return f"{shortened_w1} {shortened_w2}"
+
+    else:
+        # Multiple words - use initials + last word approach
+        last_word = words[-1]
+        other_words = words[:-1]
+
+        # Calculate space for initials
+        available_for_initials = max_length - len(last_word) - 1
+
+        if available_for_initials >= len(other_words):
+            # Use first letter of each word
+            initials = ''.join([w[0].upper() for w in other_words])
+            result = f"{initials} {last_word}"
+
+            if len(result) <= max_length:
+                return result
+
+        # If initials + last word is too long, shorten last word too
+        if available_for_initials >= 2:
+            initials = ''.join([w[0].upper() for w in other_words])
+            remaining_space = max_length - len(initials) - 1
+            shortened_last = shorten_word(last_word, remaining_space)
+            return f"{initials} {shortened_last}"
+
+        # Last resort: use first few letters of first word + last word
+        first_word_abbrev = shorten_word(words[0], max_length - len(last_word) - 1)
+        return f"{first_word_abbrev} {last_word}"
+
+
+def figure_size(df):
+    """Figure size in inches for a timetable dataframe"""
+    return max(12, len(df.columns) * 1.5), max(8, len(df.index) * 1.2)
+
+
+def draw_timetable(fig, df, class_name, use_colors=True):
     """
-    Create a structured visual representation of a timetable dataframe
+    Draw a timetable dataframe onto an existing (cleared) figure
     """
-    # Set up the figure
-    fig_width = max(12, len(df.columns) * 1.5)  
-    fig_height = max(8, len(df.index) * 1.2)
-    
-    fig, ax = plt.subplots(figsize=(fig_width, fig_height))
+    ax = fig.add_subplot()
     ax.axis('off')
     
-    # Fixed colors for special periods
-    fixed_colors = {
-        'Assembly': '#FF6B6B',
-        'Break': '#4ECDC4', 
-        'Lunch': '#45B7D1',
-        'Activity': '#96CEB4',
-        'default': '#E8E8E8'
-    }
-    
-    def generate_random_color():
-        """Generate a random pleasant color"""
-        colors = [
-            '#FFEAA7', '#DDA0DD', "#79B3A5", '#F7DC6F', '#AED6F1',
-            '#F8C471', '#D7BDE2', '#A9DFBF', '#FAD7A0', '#F5B7B1',
-            '#D5A6BD', '#AED6F1', '#A3E4D7', '#F9E79F', '#D2B4DE',
-            '#85C1E9', '#82E0AA', '#F8D7DA', '#D1ECF1', '#FFF3CD',
-            '#E2E3E5', '#D4E6F1', '#D5F4E6', '#FCF3CF', '#FADBD8'
-        ]
-        return random.choice(colors)
-    
-    def get_subject_color(subject):
-        """Get or assign color for a subject"""
-        # Check fixed colors first
-        if subject in fixed_colors:
-            return fixed_colors[subject]
-        
-        # Check if we already assigned a color to this subject
-        if subject in _subject_colors:
-            return _subject_colors[subject]
-        
-        # Assign new random color
-        color = generate_random_color()
-        _subject_colors[subject] = color
-        return color
-    
-    def abbreviate_subject(subject, max_length=12):
-        """Dynamically abbreviate long subject names intelligently"""
-        if len(subject) <= max_length:
-            return subject
-        
-        def shorten_word(word, target_length):
-            """Intelligently shorten a single word"""
-            if len(word) <= target_length:
-                return word
-            
-            # Remove vowels (except first letter) while keeping consonants
-            if target_length >= 4:
-                vowels = 'aeiouAEIOU'
-                consonants_only = word[0]  # Keep first letter
-                for char in word[1:]:
-                    if char not in vowels:
-                        consonants_only += char
-                    if len(consonants_only) >= target_length:
-                        break
-                
-                if len(consonants_only) <= target_length:
-                    return consonants_only
-            
-            # If still too long, truncate and add period
-            return word[:target_length-1] + '.'
-        
-        words = subject.split()
-        
-        if len(words) == 1:
-            # Single word - use intelligent shortening
-            return shorten_word(words[0], max_length)
-        
-        elif len(words) == 2:
-            # Two words - try different strategies
-            word1, word2 = words
-            
-            # Strategy 1: Try shortening the longer word
-            if len(word1) > len(word2):
-                shortened_w1 = shorten_word(word1, max_length - len(word2) - 1)
-                result = f"{shortened_w1} {word2}"
-                if len(result) <= max_length:
-                    return result
-            else:
-                shortened_w2 = shorten_word(word2, max_length - len(word1) - 1)
-                result = f"{word1} {shortened_w2}"
-                if len(result) <= max_length:
-                    return result
-            
-            # Strategy 2: Shorten both words proportionally
-            available_chars = max_length - 1  # -1 for space
-            w1_target = min(len(word1), available_chars // 2)
-            w2_target = available_chars - w1_target
-            
-            shortened_w1 = shorten_word(word1, w1_target)
-            shortened_w2 = shorten_word(word2, w2_target)
-            
-            return f"{shortened_w1} {shortened_w2}"
-        
-        else:
-            # Multiple words - use initials + last word approach
-            last_word = words[-1]
-            other_words = words[:-1]
-            
-            # Calculate space for initials
-            available_for_initials = max_length - len(last_word) - 1
-            
-            if available_for_initials >= len(other_words):
-                # Use first letter of each word
-                initials = ''.join([w[0].upper() for w in other_words])
-                result = f"{initials} {last_word}"
-                
-                if len(result) <= max_length:
-                    return result
-            
-            # If initials + last word is too long, shorten last word too
-            if available_for_initials >= 2:
-                initials = ''.join([w[0].upper() for w in other_words])
-                remaining_space = max_length - len(initials) - 1
-                shortened_last = shorten_word(last_word, remaining_space)
-                return f"{initials} {shortened_last}"
-            
-            # Last resort: use first few letters of first word + last word
-            first_word_abbrev = shorten_word(words[0], max_length - len(last_word) - 1)
-            return f"{first_word_abbrev} {last_word}"
-    
     # Create the table with custom styling
     table_data = []
     cell_colors = []
@@ -172,7 +193,7 @@ def create_timetable_image(df, class_name, output_file="timetable.png", use_colo
             if pd.isna(cell_value) or cell_value == '':
                 cell_value = ''
                 if use_colors:
-                    color = fixed_colors['default']
+                    color = FIXED_COLORS['default']
                 else:
                     color = '#FFFFFF'  # White background for no colors
             else:
@@ -184,7 +205,7 @@ def create_timetable_image(df, class_name, output_file="timetable.png", use_colo
                 abbreviated_subject = abbreviate_subject(subject)
                 
                 # Format subject with line breaks for multi-word subjects
-                if ' ' in abbreviated_subject and abbreviated_subject not in fixed_colors:
+                if ' ' in abbreviated_subject and abbreviated_subject not in FIXED_COLORS:
                     # Split on spaces and rejoin with \n for line breaks
                     words = abbreviated_subject.split()
                     if len(words) == 2:
@@ -254,12 +275,96 @@ def create_timetable_image(df, class_name, output_file="timetable.png", use_colo
                     cell.set_text_props(text=wrapped)
     
     # Add title
-    plt.suptitle(f"{class_name} - Weekly Timetable", 
+    fig.suptitle(f"{class_name} - Weekly Timetable", 
                 fontsize=16, fontweight='bold', y=0.99)
+    fig.tight_layout()
+
+
+def create_timetable_image(df, class_name, output_file="timetable.png", use_colors=True, dpi=None):
+    """
+    Create a structured visual representation of a timetable dataframe
+    """
+    # A standalone Agg figure is never registered with pyplot, so it is freed with its last reference
+    fig = Figure(figsize=figure_size(df))
+    FigureCanvasAgg(fig)
+    draw_timetable(fig, df, class_name, use_colors)
     
     # Save the image
-    plt.tight_layout()
-    plt.savefig(output_file, dpi=300, bbox_inches='tight', facecolor='white')
+    fig.savefig(output_file, dpi=dpi or default_dpi(), bbox_inches='tight', facecolor='white')
     print(f"✅ Timetable image saved as {output_file}")
     
     return fig
+
+
+def _init_batch_worker(subject_colors):
+    """Share subject colors with a rendering worker process"""
+    _subject_colors.update(subject_colors)
+
+
+def _render_batch_image(df, class_name, output_file, use_colors, dpi):
+    """Render one image on this process's reusable figure"""
+    global _batch_figure
+    if _batch_figure is None:
+        _batch_figure = Figure()
+        FigureCanvasAgg(_batch_figure)
+    
+    _batch_figure.clear()
+    _batch_figure.set_size_inches(figure_size(df))
+    draw_timetable(_batch_figure, df, class_name, use_colors)
+    _batch_figure.savefig(output_file, dpi=dpi, bbox_inches='tight', facecolor='white')
+    _batch_figure.clear()
+
+
+def render_timetable_images(jobs, use_colors=True, dpi=None, workers=None):
+    """
+    Render many timetable images, reusing one figure per process
+
+    Args:
+        jobs (list): (df, class_name, output_file) tuples
+        use_colors (bool): Color cells by subject
+        dpi (int): Image resolution (default: TIMETABLE_IMAGE_DPI or 300)
+        workers (int): Worker processes (default: RENDER_WORKERS or CPU count); 1 renders in-process.
+            Each worker gets at least IMAGES_PER_WORKER images so small batches skip the pool start-up cost
+
+    Returns:
+        dict: output_file -> None on success, or the exception raised while rendering it
+    """
+    dpi = dpi or default_dpi()
+    if workers is None:
+        workers = int(os.getenv("RENDER_WORKERS", "0")) or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs) // IMAGES_PER_WORKER))
+    
+    # Assign subject colors up front so every worker colors subjects the same way
+    if use_colors:
+        for df, _, _ in jobs:
+            for value in df.to_numpy().ravel():
+                if isinstance(value, str) and value:
+                    get_subject_color(value.split('(')[0].strip())
+    
+    results = {}
+    if workers == 1:
+        for df, class_name, output_file in jobs:
+            try:
+                _render_batch_image(df, class_name, output_file, use_colors, dpi)
+                results[output_file] = None
+            except Exception as e:
+                results[output_file] = e
+        return results
+    
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=get_context("spawn"),
+        initializer=_init_batch_worker,
+        initargs=(dict(_subject_colors),)
+    ) as executor:
+        futures = {
+            output_file: executor.submit(_render_batch_image, df, class_name, output_file, use_colors, dpi)
+            for df, class_name, output_file in jobs
+        }
+        for output_file, future in futures.items():
+            try:
+                future.result()
+                results[output_file] = None
+            except Exception as e:
+                results[output_file] = e
+    return results
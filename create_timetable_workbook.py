@@ -0,0 +1,57 @@
+import re
+
+import pandas as pd
+from openpyxl import Workbook
+
+# Characters Excel does not allow in sheet names
+_INVALID_SHEET_CHARS = re.compile(r"[\[\]:*?/\\]")
+
+
+def excel_sheet_name(name, used_names):
+    """
+    Make a valid, unique Excel sheet name (max 31 characters)
+    """
+    base = _INVALID_SHEET_CHARS.sub("_", name).strip("'")[:31] or "Sheet"
+    sheet_name = base
+    suffix = 2
+    while sheet_name.lower() in used_names:
+        tail = f" ({suffix})"
+        sheet_name = base[:31 - len(tail)] + tail
+        suffix += 1
+    used_names.add(sheet_name.lower())
+    return sheet_name
+
+
+def create_timetable_workbook(class_frames, output_file="timetables.xlsx", teacher_frames=None, write_only=False):
+    """
+    Write every class timetable, and optionally a sheet per teacher, into one workbook
+
+    Args:
+        class_frames (dict): Class name -> timetable DataFrame
+        output_file (str): Workbook path
+        teacher_frames (dict): Teacher name -> timetable DataFrame
+        write_only (bool): Stream rows through openpyxl's write-only (constant memory) mode
+
+    Returns:
+        list: Sheet names in workbook order
+    """
+    sheets = []
+    used_names = set()
+    for prefix, frames in (("", class_frames), ("T - ", teacher_frames or {})):
+        for name, df in frames.items():
+            sheets.append((excel_sheet_name(f"{prefix}{name}", used_names), df))
+
+    if write_only:
+        workbook = Workbook(write_only=True)
+        for sheet_name, df in sheets:
+            worksheet = workbook.create_sheet(sheet_name)
+            worksheet.append([""] + [str(column) for column in df.columns])
+            for day, row in zip(df.index, df.itertuples(index=False, name=None)):
+                worksheet.append([day, *row])
+        workbook.save(output_file)
+    else:
+        with pd.ExcelWriter(output_file, engine="openpyxl") as writer:
+            for sheet_name, df in sheets:
+                df.to_excel(writer, index=True, sheet_name=sheet_name)
+
+    return [sheet_name for sheet_name, _ in sheets]
@@ -0,0 +1,179 @@
+"""
+Deterministic stand-in chat models for running the workflow offline.
+
+The stub answers extraction calls with a fixed TimetableData payload (only
+its fixed periods and class period length, as real extraction returns) and
+generation calls by replaying a recorded schedule for the class group in the
+prompt, or by running the local solver on it, so benchmarks exercise the real
+graph without any API calls.
+"""
+
+import asyncio
+import json
+import time
+
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from incremental import load_previous_run
+from prompt_encoding import decode_class_group_payload
+from solver import solve_class_group
+from utils import parse_clock_time
+
+
+def load_recording(output_dir):
+    """Load the TimetableData and class timetables saved by a previous real run
+
+    Args:
+        output_dir (str): Output directory of the run (holds .skejul_state.json)
+
+    Returns:
+        tuple: (timetable_data, class_timetables)
+    """
+    recording = load_previous_run(output_dir)
+    if recording is None:
+        raise FileNotFoundError(f"No recorded run in {output_dir}")
+    return recording['timetable_data'], recording['class_timetables']
+
+
+def synthetic_school(n_classes=3, n_days=5, periods_per_day=8, subjects_per_class=8, classes_per_teacher=3):
+    """Build TimetableData-shaped dict for a synthetic school
+
+    Args:
+        n_classes (int): Number of class groups
+        n_days (int): Number of school days (max 7)
+        periods_per_day (int): Class periods per day, with a break halfway
+        subjects_per_class (int): Subjects taught to every class group
+        classes_per_teacher (int): How many class groups share each subject teacher
+
+    Returns:
+        dict: Data in the same shape as TimetableData.model_dump()
+    """
+    days = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"][:n_days]
+
+    def clock(minutes):
+        hour, minute = divmod(minutes, 60)
+        return f"{(hour % 12) or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+    periods = [{"type": "assembly", "start": clock(7 * 60 + 20), "end": clock(8 * 60)}]
+    minutes = 8 * 60
+    for index in range(periods_per_day):
+        if index == periods_per_day // 2:
+            periods.append({"type": "break", "start": clock(minutes), "end": clock(minutes + 20)})
+            minutes += 20
+        periods.append({"type": "class", "start": clock(minutes), "end": clock(minutes + 40)})
+        minutes += 40
+
+    # Spread the weekly slots over the subjects, leaving a little slack
+    weekly_slots = n_days * periods_per_day - 2
+    base, extra = divmod(weekly_slots, subjects_per_class)
+    class_groups = []
+    for class_index in range(n_classes):
+        class_groups.append({
+            "name": f"Class {class_index + 1}",
+            "subjects": [
+                {
+                    "name": f"Subject {subject_index + 1}",
+                    "teacher": f"Teacher {subject_index + 1}-{class_index // classes_per_teacher + 1}",
+                    "slots_per_week": base + (1 if subject_index < extra else 0)
+                }
+                for subject_index in range(subjects_per_class)
+            ]
+        })
+
+    return {
+        "days": days,
+        "start_time": periods[0]["start"],
+        "end_time": periods[-1]["end"],
+        "periods": periods,
+        "class_groups": class_groups
+    }
+
+
+def extraction_payload(timetable_data):
+    """Reduce TimetableData to what extraction returns: the fixed periods plus the class period length"""
+    lengths = {
+        parse_clock_time(period['end']) - parse_clock_time(period['start'])
+        for period in timetable_data['periods'] if period['type'] == 'class'
+    }
+    if len(lengths) != 1:
+        return timetable_data
+    return {
+        **timetable_data,
+        'periods': [period for period in timetable_data['periods'] if period['type'] != 'class'],
+        'period_duration': lengths.pop()
+    }
+
+
+class StubStructuredModel:
+    """Structured-output stand-in that returns a fixed payload"""
+
+    def __init__(self, schema, payload, latency=0.0, include_raw=False):
+        self.schema = schema
+        self.payload = payload
+        self.latency = latency
+        self.include_raw = include_raw
+
+    def respond(self):
+        parsed = self.schema(**self.payload)
+        if not self.include_raw:
+            return parsed
+        return {"raw": AIMessage(content=json.dumps(self.payload)), "parsed": parsed, "parsing_error": None}
+
+    def invoke(self, messages, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.respond()
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.respond()
+
+
+class StubChatModel:
+    """Chat model stand-in with configurable latency
+
+    Args:
+        timetable_data (dict): Payload returned for structured extraction calls
+        latency (float): Seconds to wait before every response
+        recorded (dict): Class group name -> schedule replayed instead of solving
+    """
+
+    # Characters per streamed chunk, roughly a handful of tokens
+    chunk_size = 32
+
+    def __init__(self, timetable_data=None, latency=0.0, recorded=None):
+        self.timetable_data = timetable_data or synthetic_school()
+        self.latency = latency
+        self.recorded = recorded or {}
+        self.calls = 0
+
+    def with_structured_output(self, schema, include_raw=False):
+        return StubStructuredModel(schema, extraction_payload(self.timetable_data), self.latency, include_raw)
+
+    def respond(self, messages) -> AIMessage:
+        """Answer a single class group generation prompt from the recording or the local solver"""
+        self.calls += 1
+        class_group, days, periods, availability = decode_class_group_payload(json.loads(messages[-1].content))
+        if class_group['name'] in self.recorded:
+            return AIMessage(content=json.dumps({class_group['name']: self.recorded[class_group['name']]}))
+        schedule, _ = solve_class_group(class_group, days, periods, availability)
+        return AIMessage(content=json.dumps({class_group['name']: schedule}))
+
+    def invoke(self, messages, *args, **kwargs):
+        time.sleep(self.latency)
+        return self.respond(messages)
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        return self.respond(messages)
+
+    def stream(self, messages, *args, **kwargs):
+        time.sleep(self.latency)
+        content = self.respond(messages).content
+        for start in range(0, len(content), self.chunk_size):
+            yield AIMessageChunk(content=content[start:start + self.chunk_size])
+
+    async def astream(self, messages, *args, **kwargs):
+        await asyncio.sleep(self.latency)
+        content = self.respond(messages).content
+        for start in range(0, len(content), self.chunk_size):
+            yield AIMessageChunk(content=content[start:start + self.chunk_size])
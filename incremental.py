@@ -0,0 +1,80 @@
+"""
+Incremental regeneration support.
+
+Every run saves its extracted TimetableData and class timetables next to the
+generated files. A later run can diff its fresh extraction against that
+snapshot and regenerate only the class groups whose inputs changed, plus
+any class group that shares a teacher with them.
+"""
+
+import json
+import os
+
+RUN_STATE_FILE = ".skejul_state.json"
+SCHOOL_WIDE_FIELDS = ('days', 'start_time', 'end_time', 'periods')
+
+
+def run_state_path(output_dir: str) -> str:
+    """Return the snapshot path for an output directory"""
+    return os.path.join(output_dir, RUN_STATE_FILE)
+
+
+def load_previous_run(output_dir: str):
+    """Load the previous run's snapshot, or None when there is no usable one"""
+    try:
+        with open(run_state_path(output_dir), encoding="utf-8") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def save_run(output_dir: str, timetable_data: dict, class_timetables: dict):
+    """Persist the inputs and outputs of a run for the next incremental run.
+
+    Teacher availability is not saved: it is rebuilt from the reused timetables.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    with open(run_state_path(output_dir), "w", encoding="utf-8") as file:
+        json.dump({
+            "timetable_data": timetable_data,
+            "class_timetables": class_timetables
+        }, file)
+
+
+def class_group_teachers(class_group: dict) -> set:
+    """Return the teachers assigned to a class group"""
+    return {
+        subject['teacher'] for subject in class_group.get('subjects') or []
+        if subject.get('teacher')
+    }
+
+
+def find_affected_class_groups(previous_data: dict, current_data: dict, previous_timetables: dict) -> list[str]:
+    """List the class groups that must be regenerated, in current order.
+
+    A school-wide change (days, times or periods) affects every class group.
+    Otherwise a class group is affected when it is new, its subjects changed,
+    its previous timetable is missing, or it shares a teacher with one of those
+    (or with a class group that was removed).
+    """
+    current_groups = {group['name']: group for group in current_data['class_groups']}
+    if any(previous_data.get(field) != current_data.get(field) for field in SCHOOL_WIDE_FIELDS):
+        return list(current_groups)
+
+    previous_groups = {group['name']: group for group in previous_data.get('class_groups') or []}
+    changed = {
+        name for name, group in current_groups.items()
+        if previous_groups.get(name) != group or name not in previous_timetables
+    }
+
+    # Teachers whose load changed: from the old and new definition of changed groups and removed groups
+    affected_teachers = set()
+    for name in changed | (previous_groups.keys() - current_groups.keys()):
+        for groups in (previous_groups, current_groups):
+            if name in groups:
+                affected_teachers |= class_group_teachers(groups[name])
+
+    return [
+        name for name, group in current_groups.items()
+        if name in changed or class_group_teachers(group) & affected_teachers
+    ]
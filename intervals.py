@@ -0,0 +1,67 @@
+"""
+Interval overlap queries in integer minutes.
+
+Lessons that do not sit exactly on the school's period grid (a 35-minute
+period next to 40-minute ones, or times the model shifted) can still clash
+with a lesson in another class_group. IntervalIndex answers "what overlaps
+[start, end)?" with a bisect over interval starts, and find_overlaps finds
+every overlapping pair of a batch in one sweep over the sorted starts.
+Intervals are half-open, so a lesson ending at 08:40 does not clash with
+one starting at 08:40.
+"""
+
+from bisect import bisect_left, insort
+
+
+class IntervalIndex:
+    """Sorted [start, end) intervals with bisect overlap queries
+
+    Queries look left from the first interval starting at or after `end`,
+    only as far back as the longest interval added, so each query costs
+    O(log n + intervals in that window).
+    """
+
+    __slots__ = ('entries', 'longest')
+
+    def __init__(self, intervals=()):
+        # The serial number breaks ties, so items never need to be comparable
+        self.entries = sorted((start, end, serial, item) for serial, (start, end, item) in enumerate(intervals))
+        self.longest = max((end - start for start, end, _, _ in self.entries), default=0)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def add(self, start: int, end: int, item):
+        insort(self.entries, (start, end, len(self.entries), item))
+        self.longest = max(self.longest, end - start)
+
+    def overlapping(self, start: int, end: int) -> list:
+        """Return the (start, end, item) intervals that overlap [start, end), ordered by start"""
+        found = []
+        position = bisect_left(self.entries, (end,))
+        while position > 0:
+            position -= 1
+            entry_start, entry_end, _, item = self.entries[position]
+            if entry_start + self.longest <= start:
+                break
+            if entry_end > start and entry_start < end:
+                found.append((entry_start, entry_end, item))
+        found.reverse()
+        return found
+
+
+def find_overlaps(intervals):
+    """Yield every pair of overlapping (start, end, item) intervals with a sweep line
+
+    Args:
+        intervals (iterable): (start, end, item) tuples, in any order
+
+    Yields:
+        tuple: (earlier, later) intervals, ordered by start time
+    """
+    active = []
+    for interval in sorted(intervals, key=lambda interval: (interval[0], interval[1])):
+        active = [other for other in active if other[1] > interval[0]]
+        for other in active:
+            yield other, interval
+        active.append(interval)
@@ -0,0 +1,294 @@
+"""
+Content-addressed on-disk cache for LLM responses.
+
+Responses are stored in a small SQLite database keyed by a hash of
+(model, provider, temperature, system prompt hash, message payload hash),
+with a time-to-live and least-recently-used eviction once the cache grows
+past its size budget.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from langchain_core.messages import AIMessage, SystemMessage
+
+from tracing import record_cache_lookup, record_llm_response
+
+
+def hash_text(text: str) -> str:
+    """Return the SHA-256 hex digest of a string"""
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """Size-bounded LRU cache with TTL backed by SQLite"""
+
+    def __init__(self, directory=".skejul_cache", ttl_seconds=7 * 24 * 3600, max_bytes=100 * 1024 * 1024):
+        self.path = os.path.join(directory, "llm_cache.sqlite")
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = True
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        with self._connect() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def _record(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def get(self, key: str):
+        """Return the cached value for key, or None on a miss or expired entry"""
+        now = time.time()
+        with self._connect() as connection:
+            row = connection.execute(
+                "SELECT value, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                row = None
+            if row:
+                connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+
+        self._record(row is not None)
+        return row[0] if row else None
+
+    def set(self, key: str, value: str):
+        """Store a value and evict least recently used entries over the size budget"""
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            connection.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl_seconds,))
+
+            total = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                for old_key, old_size in connection.execute(
+                    "SELECT key, size FROM responses ORDER BY accessed_at ASC"
+                ).fetchall():
+                    if total <= self.max_bytes:
+                        break
+                    connection.execute("DELETE FROM responses WHERE key = ?", (old_key,))
+                    total -= old_size
+
+    def delete(self, key: str):
+        """Drop one cached value"""
+        with self._connect() as connection:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+    def clear(self):
+        """Remove every cached response"""
+        with self._connect() as connection:
+            connection.execute("DELETE FROM responses")
+
+    def stats(self) -> dict:
+        """Return hit/miss counters for the current process"""
+        return {"hits": self.hits, "misses": self.misses}
+
+
+_cache = None
+
+
+def get_cache() -> LLMCache:
+    """Return the shared cache, configured from environment variables"""
+    global _cache
+    if _cache is None:
+        _cache = LLMCache(
+            directory=os.getenv("LLM_CACHE_DIR", ".skejul_cache"),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", str(7 * 24 * 3600))),
+            max_bytes=int(float(os.getenv("LLM_CACHE_MAX_MB", "100")) * 1024 * 1024)
+        )
+        _cache.enabled = os.getenv("LLM_CACHE_ENABLED", "true").lower() not in ("0", "false", "no")
+    return _cache
+
+
+class CachedChatModel:
+    """Wrap a chat model so identical requests are answered from the on-disk cache"""
+
+    def __init__(self, model, provider: str, model_name: str, temperature: float, schema=None):
+        self.model = model
+        self.provider = provider
+        self.model_name = model_name
+        self.temperature = temperature
+        self.schema = schema
+
+    def with_structured_output(self, schema):
+        """Return a cached wrapper around the model's structured output runnable
+
+        The runnable is asked for the raw message too, so the token usage of
+        extraction calls can be recorded; callers still get the parsed object.
+        """
+        return CachedChatModel(
+            self.model.with_structured_output(schema, include_raw=True),
+            self.provider, self.model_name, self.temperature, schema=schema
+        )
+
+    def cache_key(self, messages) -> str:
+        """Build the content-addressed key for a list of messages"""
+        system_prompt = "\n".join(m.content for m in messages if isinstance(m, SystemMessage))
+        payload = json.dumps(
+            [[m.type, m.content] for m in messages if not isinstance(m, SystemMessage)]
+        )
+        return hash_text(json.dumps({
+            "model": self.model_name,
+            "provider": self.provider,
+            "temperature": self.temperature,
+            "schema": self.schema.__name__ if self.schema else None,
+            "system": hash_text(system_prompt),
+            "payload": hash_text(payload)
+        }, sort_keys=True))
+
+    def _received(self, response):
+        """Record a model response's usage and return it, unwrapping the parsed object of structured output"""
+        if not self.schema:
+            record_llm_response(response)
+            return response
+        record_llm_response(response['raw'])
+        if response.get('parsing_error') is not None:
+            raise response['parsing_error']
+        return response['parsed']
+
+    def _check(self, cache, key, response, validate, cached):
+        """Run validate on a response, dropping it from the cache (or never storing it) when it is rejected"""
+        if validate is None:
+            return
+        try:
+            validate(response)
+        except Exception:
+            if cached:
+                cache.delete(key)
+            raise
+
+    def invoke(self, messages, *args, validate=None, **kwargs):
+        """Answer from the cache or the model
+
+        Args:
+            validate (callable): Called with a response before it is cached (or returned from the
+                cache). When it raises, the response is not kept, so the caller's re-ask reaches the model
+        """
+        cache = get_cache()
+        if not cache.enabled:
+            return self._received(self.model.invoke(messages, *args, **kwargs))
+
+        key = self.cache_key(messages)
+        cached = cache.get(key)
+        record_cache_lookup(cached is not None)
+        if cached is not None:
+            response = self._load(cached)
+            self._check(cache, key, response, validate, cached=True)
+            return response
+
+        response = self._received(self.model.invoke(messages, *args, **kwargs))
+        self._check(cache, key, response, validate, cached=False)
+        cache.set(key, self._dump(response))
+        return response
+
+    async def ainvoke(self, messages, *args, validate=None, **kwargs):
+        cache = get_cache()
+        if not cache.enabled:
+            return self._received(await self.model.ainvoke(messages, *args, **kwargs))
+
+        key = self.cache_key(messages)
+        cached = await asyncio.to_thread(cache.get, key)
+        record_cache_lookup(cached is not None)
+        if cached is not None:
+            response = self._load(cached)
+            await asyncio.to_thread(self._check, cache, key, response, validate, True)
+            return response
+
+        response = self._received(await self.model.ainvoke(messages, *args, **kwargs))
+        self._check(cache, key, response, validate, cached=False)
+        await asyncio.to_thread(cache.set, key, self._dump(response))
+        return response
+
+    def stream(self, messages, *args, validate=None, **kwargs):
+        """Stream the response, replaying a cached one as a single chunk and caching streams read to the end
+
+        validate is called once the caller has consumed the last chunk, as in invoke
+        """
+        cache = get_cache()
+        key = self.cache_key(messages) if cache.enabled else None
+        if key:
+            cached = cache.get(key)
+            record_cache_lookup(cached is not None)
+            if cached is not None:
+                response = self._load(cached)
+                yield response
+                self._check(cache, key, response, validate, cached=True)
+                return
+
+        response = None
+        try:
+            for chunk in self.model.stream(messages, *args, **kwargs):
+                response = chunk if response is None else response + chunk
+                yield chunk
+        finally:
+            record_llm_response(response)
+        if key and response is not None:
+            self._check(cache, key, response, validate, cached=False)
+            cache.set(key, self._dump(response))
+
+    async def astream(self, messages, *args, validate=None, **kwargs):
+        """Async counterpart of stream"""
+        cache = get_cache()
+        key = self.cache_key(messages) if cache.enabled else None
+        if key:
+            cached = await asyncio.to_thread(cache.get, key)
+            record_cache_lookup(cached is not None)
+            if cached is not None:
+                response = self._load(cached)
+                yield response
+                await asyncio.to_thread(self._check, cache, key, response, validate, True)
+                return
+
+        response = None
+        try:
+            async for chunk in self.model.astream(messages, *args, **kwargs):
+                response = chunk if response is None else response + chunk
+                yield chunk
+        finally:
+            record_llm_response(response)
+        if key and response is not None:
+            self._check(cache, key, response, validate, cached=False)
+            await asyncio.to_thread(cache.set, key, self._dump(response))
+
+    def _dump(self, response) -> str:
+        if self.schema:
+            return response.model_dump_json()
+        return json.dumps({"content": response.content})
+
+    def _load(self, value: str):
+        if self.schema:
+            return self.schema.model_validate_json(value)
+        return AIMessage(content=json.loads(value)["content"])
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
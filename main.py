@@ -1,20 +1,22 @@
+import argparse
+import asyncio
+import functools
 import json
 import os
-import pandas as pd
-from datetime import datetime
+import threading
+import weakref
 from dotenv import load_dotenv
 
-from langchain.chat_models import init_chat_model
 from langchain_core.messages import SystemMessage, HumanMessage
 from langgraph.graph import StateGraph, START, END
-from langchain_groq import ChatGroq
+from langgraph.types import Send
 
 # Local imports
-from models import TimeTableState, TimetableData
+from models import TimeTableState, TimetableData, Replace
 from niceterminalui import (
     print_banner, print_step, print_success, print_warning, print_error, 
     print_info, print_result_box, print_completion_message, print_table,
-    print_status_panel, print_alert
+    print_status_panel, print_alert, create_progress_bar
 )
 
 from prompts import (
@@ -23,62 +25,118 @@ from prompts import (
     GENERATE_SINGLE_GRADE_PROMPT,
     USER_PROMPT
 )
-from utils import remove_markdown_code_blocks
-from create_timetable_image import create_timetable_image
+from utils import remove_markdown_code_blocks, partition_teacher_disjoint, safe_filename
+from solver import solve_class_group
+from llm_cache import CachedChatModel, get_cache
+from scheduler import ScheduledChatModel, scheduler_from_env
+from availability import SlotIndex, TeacherAvailability
+from schedule import Schedule
+from period_grid import expand_period_grid
+from checkpoints import create_checkpointer, new_thread_id, thread_config, checkpoint_db_path
+from validation import find_violations, offending_class_groups
+from repair import repair_timetables
+from incremental import load_previous_run, save_run, find_affected_class_groups, run_state_path
+from prompt_encoding import encode_class_group_payload, dumps_payload
+from stream_parser import ScheduleStreamParser, chunk_text
+from tracing import get_tracer, traced_node, record_file_written, record_retry, TABLE_HEADERS
 
 load_dotenv()
 
 # Initialize language models from environment variables
 def create_structured_llm():
+    from langchain.chat_models import init_chat_model
+
     provider = os.getenv("STRUCTURED_LLM_PROVIDER", "google_genai")
     model = os.getenv("STRUCTURED_LLM_MODEL", "gemini-2.5-flash")
     temperature = float(os.getenv("STRUCTURED_LLM_TEMPERATURE", "0"))
     
-    return init_chat_model(
-        model=model,
-        model_provider=provider,
-        temperature=temperature
+    return CachedChatModel(
+        ScheduledChatModel(
+            init_chat_model(
+                model=model,
+                model_provider=provider,
+                temperature=temperature
+            ),
+            scheduler_from_env("STRUCTURED_LLM", provider)
+        ),
+        provider, model, temperature
     )
 
 def create_llm():
+    from langchain.chat_models import init_chat_model
+
     provider = os.getenv("LLM_PROVIDER", "google_genai")
     model = os.getenv("LLM_MODEL", "gemini-2.5-flash")
     temperature = float(os.getenv("LLM_TEMPERATURE", "0.1"))
 
-    return init_chat_model(
-        model=model,
-        model_provider=provider,
-        temperature=temperature
+    return CachedChatModel(
+        ScheduledChatModel(
+            init_chat_model(
+                model=model,
+                model_provider=provider,
+                temperature=temperature
+            ),
+            scheduler_from_env("LLM", provider)
+        ),
+        provider, model, temperature
     )
 
-# Initialize LLMs
-structured_llm = create_structured_llm()
-llm = create_llm() 
+# LLMs are created on first use, so importing this module (e.g. to draw the graph) stays fast
+structured_llm = None
+llm = None
+_llm_lock = threading.Lock()
+
+
+def get_structured_llm():
+    """Return the structured output LLM, creating it on first use"""
+    global structured_llm
+    with _llm_lock:
+        if structured_llm is None:
+            structured_llm = create_structured_llm()
+    return structured_llm
+
+
+def get_llm():
+    """Return the generation LLM, creating it on first use"""
+    global llm
+    with _llm_lock:
+        if llm is None:
+            llm = create_llm()
+    return llm
 
 # WORKFLOW FUNCTIONS
-def get_timetable_data(state: TimeTableState) -> TimeTableState:
+def get_timetable_data(state: TimeTableState) -> dict:
     """Extract structured timetable data from user input."""
     print_step("Extracting data into structured table", "📊")
-    structured_output_llm = structured_llm.with_structured_output(TimetableData)
+    structured_output_llm = get_structured_llm().with_structured_output(TimetableData)
     response: TimetableData = structured_output_llm.invoke([
         SystemMessage(content=GET_TIMETABLE_SYSTEM_PROMPT),
         HumanMessage(content=state["input"])
     ])
     print_success("Done extracting data!")
 
-    state["timetable_data"] = response.model_dump()
-    return state
+    return {"timetable_data": build_period_grid(response.model_dump())}
+
 
+def build_period_grid(timetable_data: dict) -> dict:
+    """Generate the class periods between the extracted fixed periods and normalise every time"""
+    try:
+        timetable_data = expand_period_grid(timetable_data)
+    except (KeyError, ValueError) as e:
+        print_warning(f"Could not build the period grid, keeping the extracted periods: {e}")
+        return timetable_data
+    class_periods = sum(1 for period in timetable_data['periods'] if period['type'] == 'class')
+    print_info(f"Period grid: {class_periods} class periods of {len(timetable_data['periods'])} per day")
+    return timetable_data
 
-def validate_timetable_data(state: TimeTableState) -> TimeTableState:
+
+def validate_timetable_data(state: TimeTableState) -> dict:
     """Validate that required timetable data is present."""
     missing = []
     data = state["timetable_data"]
 
     if not data:
-        state['validated'] = False
-        state['validation_errors'] = ["Missing timetable data entirely"]
-        return state
+        return {'validated': False, 'validation_errors': ["Missing timetable data entirely"]}
 
     if not data['days']:
         missing.append("school days")
@@ -86,6 +144,8 @@ def validate_timetable_data(state: TimeTableState) -> TimeTableState:
         missing.append("school start/end time")
     if not data['periods']:
         missing.append("named periods (e.g., breaks, assembly)")
+    elif not any(period['type'] == 'class' for period in data['periods']):
+        missing.append("class period duration (e.g., 40 minutes)")
     if not data['class_groups']:
         missing.append("class groups")
 
@@ -98,9 +158,7 @@ def validate_timetable_data(state: TimeTableState) -> TimeTableState:
     }
     print_status_panel("Data Validation Results", validation_status)
 
-    state['validated'] = len(missing) == 0
-    state['validation_errors'] = missing if missing else None
-    return state
+    return {'validated': len(missing) == 0, 'validation_errors': missing if missing else None}
 
 
 def route_on_validation(state: TimeTableState) -> str:
@@ -121,94 +179,322 @@ def invalid(state: TimeTableState):
     print_alert("Invalid state encountered!", "error")
     missing_items = "\n".join([f"• {item}" for item in state['validation_errors']])
     print_result_box("Missing Data", missing_items)
-    return state
+    return {}
 
 
 def abort(state: TimeTableState):
     """Abort workflow after too many attempts."""
     print_error("Too many attempts. Aborting.")
-    return state
+    return {}
 
 
-def initialize_sequential_processing(state: TimeTableState) -> TimeTableState:
+def initialize_sequential_processing(state: TimeTableState) -> dict:
     """Initialize the sequential class_group processing"""
     print_step("Initializing sequential processing", "🔄")
     
     # Extract all class_group names from timetable_data
     all_class_groups = [class_group['name'] for class_group in state['timetable_data']['class_groups']]
     
-    state['all_grades'] = all_class_groups
-    state['current_grade_index'] = 0
-    state['teacher_availability'] = {}  # Start with no teacher constraints
-    state['class_timetables'] = {}  # Initialize empty timetables
-    state['class_timetables_df'] = {} 
+    generation_engine = state.get('generation_engine') or os.getenv("GENERATION_ENGINE", "llm")
+    generation_mode = state.get('generation_mode') or os.getenv("GENERATION_MODE", "sequential")
 
     print_info(f"Processing {len(all_class_groups)} class_groups: {', '.join(all_class_groups)}")
-    return state
+    print_info(f"Generation engine: {generation_engine} ({generation_mode})")
+    return {
+        'all_grades': all_class_groups,
+        'current_grade_index': 0,
+        # Merged channels start empty, even when the thread already holds an earlier run
+        'teacher_availability': Replace({}),  # Start with no teacher constraints
+        'class_timetables': Replace({}),
+        'streamed_columns': Replace({}),
+        'class_timetables_df': {},
+        'teacher_timetables': {},
+        'teacher_timetables_df': {},
+        'timetable_violations': [],
+        'validation_round': 0,
+        'generation_engine': generation_engine,
+        'generation_mode': generation_mode
+    }
+
+
+def get_output_dir(state: TimeTableState) -> str:
+    """Return the directory generated files and run snapshots are written to"""
+    return state.get('output_dir') or "generated_timetables"
+
+
+def plan_incremental_regeneration(state: TimeTableState) -> dict:
+    """Reuse class_groups whose inputs are unchanged since the previous run"""
+    incremental = state.get('incremental')
+    if incremental is None:
+        incremental = os.getenv("INCREMENTAL_REGENERATION", "false").lower() in ("1", "true", "yes")
+    if not incremental:
+        return {'reused_class_groups': []}
+
+    print_step("Planning incremental regeneration", "♻️")
+    previous = load_previous_run(get_output_dir(state))
+    if previous is None:
+        print_info("No previous run found, generating every class_group")
+        return {'reused_class_groups': []}
+
+    affected = find_affected_class_groups(
+        previous['timetable_data'], state['timetable_data'], previous['class_timetables']
+    )
+    reused = [name for name in state['all_grades'] if name not in affected]
+
+    # Seed the state with the reused timetables and the teacher time they occupy
+    class_timetables = {class_group: previous['class_timetables'][class_group] for class_group in reused}
+    teacher_availability = Schedule.from_class_timetables(class_timetables, state['timetable_data']).teacher_busy_masks()
+
+    print_info(f"Reusing {len(reused)} class_groups: {', '.join(reused) or 'none'}")
+    print_info(f"Regenerating {len(affected)} class_groups: {', '.join(affected) or 'none'}")
+    return {
+        'class_timetables': class_timetables,
+        'teacher_availability': teacher_availability,
+        'all_grades': affected,
+        'reused_class_groups': reused
+    }
+
+
+def route_generation_mode(state: TimeTableState) -> str:
+    """Choose between parallel waves and the sequential class_group loop"""
+    if not state['all_grades']:
+        print_success("All class_groups reused!")
+        return "validate_timetables"
+    if state.get('generation_mode') == "parallel":
+        return "parallel"
+    return route_generation_engine(state)
+
+
+def route_generation_engine(state: TimeTableState) -> str:
+    """Pick the node that generates the current class_group"""
+    return "solver" if state.get('generation_engine') == "solver" else "llm"
+
+
+def find_class_group(timetable_data: dict, class_group_name: str) -> dict:
+    """Return the extracted data for one class_group"""
+    for class_group in timetable_data['class_groups']:
+        if class_group['name'] == class_group_name:
+            return class_group
+    return None
+
+
+def build_class_group_messages(class_group_name: str, timetable_data: dict, teacher_availability: dict) -> list:
+    """Build the generation prompt for a single class_group"""
+    payload = encode_class_group_payload(
+        find_class_group(timetable_data, class_group_name), timetable_data, teacher_availability
+    )
+    return [
+        SystemMessage(content=GENERATE_SINGLE_GRADE_PROMPT),
+        HumanMessage(content=dumps_payload(payload))
+    ]
+
+
+def stream_parsing_enabled() -> bool:
+    """Whether generation completions are streamed through ScheduleStreamParser (LLM_STREAM_PARSE)"""
+    return os.getenv("LLM_STREAM_PARSE", "true").lower() in ("1", "true", "yes")
+
+
+def generation_attempts() -> int:
+    """Completions to ask for before an unparseable schedule is fatal, i.e. 1 + LLM_MAX_REASKS"""
+    return 1 + max(0, int(os.getenv("LLM_MAX_REASKS", "2")))
 
 
-def generate_single_class_group(state: TimeTableState) -> TimeTableState:
+def new_schedule_parser(class_group_name: str, timetable_data: dict, lenient: bool = False) -> ScheduleStreamParser:
+    """Build a stream parser for one class_group that reports each day as soon as it is complete"""
+    return ScheduleStreamParser(
+        class_group_name, timetable_data['days'], timetable_data['periods'],
+        on_day=lambda day, periods: print_info(f"{class_group_name}: {day} received ({len(periods)} periods)"),
+        strict=not lenient
+    )
+
+
+def streamed_schedule(class_group_name: str, parser: ScheduleStreamParser) -> dict:
+    """Return the parser's schedule, warning when a lenient parse kept a completion that broke the period grid"""
+    schedule = parser.result()
+    if parser.error is not None:
+        print_warning(f"Keeping {class_group_name} completion for validation despite: {parser.error}")
+    return schedule
+
+
+def completion_parser(class_group_name: str):
+    """Parse a whole (non-streamed) completion into one class_group's schedule"""
+    def parse(result) -> dict:
+        class_group_timetable = json.loads(remove_markdown_code_blocks(result.content))
+        return class_group_timetable[class_group_name]
+    return parse
+
+
+def request_class_group_schedule(class_group_name: str, timetable_data: dict, messages: list, lenient: bool = False) -> dict:
+    """Request one completion and parse it, raising ValueError or KeyError when it is malformed
+
+    With lenient, a streamed completion that breaks the period grid is read to the end and
+    parsed as plain JSON, so timetable validation and repair deal with it instead
+    """
+    # A completion is only cached once it parses, so a re-ask reaches the model instead of the same bad answer
+    if not stream_parsing_enabled():
+        parse = completion_parser(class_group_name)
+        return parse(get_llm().invoke(messages, validate=parse))
+    
+    # Validate the schedule while it streams, dropping a broken completion as soon as it goes wrong
+    parser = new_schedule_parser(class_group_name, timetable_data, lenient)
+    chunks = get_llm().stream(messages, validate=lambda response: parser.result())
+    try:
+        for chunk in chunks:
+            parser.feed(chunk_text(chunk))
+    finally:
+        chunks.close()
+    return streamed_schedule(class_group_name, parser)
+
+
+def report_discarded_completion(class_group_name: str, attempt: int, error: Exception):
+    """Warn about a malformed completion and count the re-ask that follows it"""
+    print_warning(f"Discarded {class_group_name} completion (attempt {attempt}): {error}")
+    if attempt < generation_attempts():
+        record_retry()
+
+
+def llm_generate_class_group(class_group_name: str, timetable_data: dict, teacher_availability: dict) -> dict:
+    """Ask the LLM for a single class_group's weekly schedule, re-asking when a completion is malformed"""
+    messages = build_class_group_messages(class_group_name, timetable_data, teacher_availability)
+    for attempt in range(1, generation_attempts() + 1):
+        try:
+            # The last attempt keeps a parseable completion even if it breaks the grid
+            return request_class_group_schedule(
+                class_group_name, timetable_data, messages, lenient=attempt == generation_attempts()
+            )
+        except (ValueError, KeyError) as e:
+            error = e
+            report_discarded_completion(class_group_name, attempt, e)
+    raise error
+
+
+def solver_generate_class_group(class_group_name: str, timetable_data: dict, teacher_availability: dict) -> dict:
+    """Build a single class_group's weekly schedule with the local constraint solver"""
+    schedule, unplaced = solve_class_group(
+        find_class_group(timetable_data, class_group_name),
+        timetable_data['days'],
+        timetable_data['periods'],
+        TeacherAvailability(SlotIndex.from_timetable_data(timetable_data), teacher_availability)
+    )
+
+    if unplaced:
+        missing = ", ".join(f"{subject} x{count}" for subject, count in unplaced.items())
+        print_warning(f"Could not place all lessons for {class_group_name}: {missing}")
+    return schedule
+
+
+def collect_teacher_busy_times(class_group_schedule: dict, timetable_data: dict) -> dict[str, list[int]]:
+    """Extract per-day teacher busy bitmasks from one class_group's schedule"""
+    index = SlotIndex.from_timetable_data(timetable_data)
+    busy_times = TeacherAvailability(index)
+    for day, periods in class_group_schedule.items():
+        for period in periods:
+            subject = period.get('subject')
+            if period['type'] == 'class' and subject and subject.get('teacher_name'):
+                # A lesson off the grid blocks every period it overlaps
+                positions = index.busy_positions(period['start'], period['end'])
+                if day not in index.day_positions or not positions:
+                    print_warning(f"Ignoring {day} {period['start']}-{period['end']}: not in the period grid")
+                    continue
+                for position in positions:
+                    busy_times.mark_busy(subject['teacher_name'], day, position)
+    return busy_times.masks
+
+
+def generate_single_class_group(state: TimeTableState) -> dict:
     """Generate timetable for current class_group only"""
     current_class_group = state['all_grades'][state['current_grade_index']]
     print_step(f"Generating timetable for {current_class_group}", "🎯")
     
-    # Find current class_group's data
-    current_class_group_data = None
-    for class_group in state['timetable_data']['class_groups']:
-        if class_group['name'] == current_class_group:
-            current_class_group_data = class_group
-            break
-    
-    # Create single-class_group prompt data
-    single_class_group_data = {
-        'days': state['timetable_data']['days'],
-        'start_time': state['timetable_data']['start_time'],
-        'end_time': state['timetable_data']['end_time'],
-        'periods': state['timetable_data']['periods'],
-        'class_groups': [current_class_group_data], 
-        'teacher_constraints': state['teacher_availability']
-    }
-    
-    # Generate timetable for this class_group
-    result = llm.invoke([
-        SystemMessage(content=GENERATE_SINGLE_GRADE_PROMPT),
-        HumanMessage(content=json.dumps(single_class_group_data, indent=2))
-    ])
-    
-    # Parse result and add to state
-    class_group_timetable = json.loads(remove_markdown_code_blocks(result.content))
-    state['class_timetables'][current_class_group] = class_group_timetable[current_class_group]
+    schedule = llm_generate_class_group(current_class_group, state['timetable_data'], state['teacher_availability'])
     
     print_success(f"Done generating {current_class_group}!")
-    return state
+    return {'class_timetables': {current_class_group: schedule}}
+
+
+def solve_single_class_group(state: TimeTableState) -> dict:
+    """Generate timetable for current class_group with the local constraint solver"""
+    current_class_group = state['all_grades'][state['current_grade_index']]
+    print_step(f"Solving timetable for {current_class_group}", "🧩")
+
+    schedule = solver_generate_class_group(current_class_group, state['timetable_data'], state['teacher_availability'])
+
+    print_success(f"Done solving {current_class_group}!")
+    return {'class_timetables': {current_class_group: schedule}}
 
 
-def update_teacher_availability(state: TimeTableState) -> TimeTableState:
+def update_teacher_availability(state: TimeTableState) -> dict:
     """Extract teacher busy times from newly generated timetable"""
     current_class_group = state['all_grades'][state['current_grade_index']]
     print_step(f"Updating teacher availability from {current_class_group}", "📝")
     
     class_group_schedule = state['class_timetables'][current_class_group]
     
-    # Extract teacher busy times
-    for day, periods in class_group_schedule.items():
-        for period in periods:
-            subject = period.get('subject')
-            if period['type'] == 'class' and subject and subject.get('teacher_name'):
-                teacher = subject['teacher_name']
-                time_slot = f"{day} {period['start']}-{period['end']}"
-                
-                if teacher not in state['teacher_availability']:
-                    state['teacher_availability'][teacher] = []
-                state['teacher_availability'][teacher].append(time_slot)    
-    return state
+    # Only the new class_group's busy times are returned, the reducer ORs them into the channel
+    return {'teacher_availability': collect_teacher_busy_times(class_group_schedule, state['timetable_data'])}
+
+
+def plan_parallel_waves(state: TimeTableState) -> dict:
+    """Partition class_groups into teacher-disjoint waves for concurrent generation"""
+    print_step("Planning parallel generation waves", "🔀")
 
+    pending_class_groups = [
+        class_group for class_group in state['timetable_data']['class_groups']
+        if class_group['name'] in state['all_grades']
+    ]
+    waves = partition_teacher_disjoint(pending_class_groups)
 
-def increment_class_group_index(state: TimeTableState) -> TimeTableState:
+    for index, wave in enumerate(waves, start=1):
+        print_info(f"Wave {index}: {', '.join(wave)}")
+    return {'waves': waves, 'current_wave_index': 0}
+
+
+def dispatch_wave(state: TimeTableState):
+    """Fan out the current wave, one generation task per class_group"""
+    if state['current_wave_index'] >= len(state['waves']):
+        print_success("All class_groups processed!")
+        return "validate_timetables"
+
+    return [
+        Send('generate_class_group_task', {
+            'class_group': class_group,
+            'timetable_data': state['timetable_data'],
+            'teacher_availability': state['teacher_availability'],
+            'generation_engine': state['generation_engine']
+        })
+        for class_group in state['waves'][state['current_wave_index']]
+    ]
+
+
+def generate_class_group_task(task: dict) -> dict:
+    """Generate one class_group of a wave and report its schedule and teacher busy times"""
+    class_group = task['class_group']
+    print_info(f"Generating {class_group} ({task['generation_engine']})")
+
+    if task['generation_engine'] == "solver":
+        schedule = solver_generate_class_group(class_group, task['timetable_data'], task['teacher_availability'])
+    else:
+        schedule = llm_generate_class_group(class_group, task['timetable_data'], task['teacher_availability'])
+
+    print_success(f"Done generating {class_group}!")
+    return {
+        'class_timetables': {class_group: schedule},
+        'teacher_availability': collect_teacher_busy_times(schedule, task['timetable_data'])
+    }
+
+
+def merge_wave(state: TimeTableState) -> dict:
+    """Advance to the next wave once every task of the current one has merged"""
+    current_wave_index = state['current_wave_index'] + 1
+    print_info(f"Merged wave {current_wave_index} of {len(state['waves'])}")
+    return {'current_wave_index': current_wave_index}
+
+
+def increment_class_group_index(state: TimeTableState) -> dict:
     """Increment the current class_group index"""
-    state['current_grade_index'] += 1
-    print_info(f"Moving to index {state['current_grade_index']}")
-    return state
+    current_grade_index = state['current_grade_index'] + 1
+    print_info(f"Moving to index {current_grade_index}")
+    return {'current_grade_index': current_grade_index}
 
 
 def route_next_class_group(state: TimeTableState) -> str:
@@ -216,169 +502,778 @@ def route_next_class_group(state: TimeTableState) -> str:
     if state['current_grade_index'] < len(state['all_grades']):
         next_class_group = state['all_grades'][state['current_grade_index']]
         print_info(f"Next class_group: {next_class_group}")
-        return "continue"
+        return route_generation_engine(state)
     else:
         print_success("All class_groups processed!")
-        return "convert_to_dataframes"
+        return "validate_timetables"
 
 
-def convert_to_dataframes(state: TimeTableState) -> TimeTableState:
-    """Convert class timetables to pandas DataFrames"""
-    print_step("Converting timetables to DataFrames", "📊")
-    
-    all_classes = state['class_timetables']
+def max_regeneration_rounds(state: TimeTableState) -> int:
+    """Targeted regeneration rounds allowed before violations are only reported (MAX_REGENERATION_ROUNDS)"""
+    return int(os.getenv("MAX_REGENERATION_ROUNDS", "2"))
+
+
+def validate_generated_timetables(state: TimeTableState) -> dict:
+    """Check every class timetable for teacher clashes, grid mismatches and quota violations"""
+    print_step("Validating generated timetables", "🔎")
+    violations = find_violations(state['class_timetables'], state['timetable_data'])
+    update = {'timetable_violations': violations, 'validation_round': state.get('validation_round') or 0}
     
-    # Step 1: Collect all unique time slots used across all classes
-    time_slots_set = set()
+    if not violations:
+        print_success("No clashes or quota violations found!")
+        return update
     
-    for class_data in all_classes.values():
-        for day_periods in class_data.values():
-            for period in day_periods:
-                time_range = f"{period['start']} - {period['end']}"
-                time_slots_set.add(time_range)
+    counts = {}
+    for record in violations:
+        counts[record['kind']] = counts.get(record['kind'], 0) + 1
+    print_warning(f"Found {len(violations)} violations: " + ", ".join(f"{count} {kind}" for kind, count in counts.items()))
+    print_table(
+        "Timetable Violations",
+        ["Kind", "Class Group", "Details"],
+        [[record['kind'], record['class_group'], record['message']] for record in violations[:20]],
+        style="yellow"
+    )
+    if len(violations) > 20:
+        print_info(f"... and {len(violations) - 20} more")
+    return update
+
+
+def route_after_timetable_validation(state: TimeTableState) -> str:
+    """Try a local repair whenever violations were found"""
+    return "repair" if state['timetable_violations'] else "convert_to_dataframes"
+
+
+def repair_generated_timetables(state: TimeTableState) -> dict:
+    """Fix clashes and quota violations by moving and swapping lessons, before falling back to the LLM"""
+    if os.getenv("LOCAL_REPAIR", "true").lower() not in ("1", "true", "yes"):
+        return {}
+    print_step("Repairing timetables locally", "🛠️")
     
-    # Step 2: Sort time slots chronologically
-    def time_key(time_range):
-        start = time_range.split(" - ")[0]
-        return datetime.strptime(start, "%I:%M %p")
+    timetables, changed, remaining = repair_timetables(
+        state['class_timetables'], state['timetable_data'], state['timetable_violations']
+    )
+    if not changed:
+        print_info("No violations could be fixed locally")
+        return {}
     
-    sorted_time_slots = sorted(time_slots_set, key=time_key)
+    teacher_availability = Schedule.from_class_timetables(timetables, state['timetable_data']).teacher_busy_masks()
+    print_success(f"Repaired {', '.join(sorted(changed))}: {len(remaining)} violations left for regeneration")
+    return {
+        'class_timetables': Replace(timetables),
+        'teacher_availability': Replace(teacher_availability),
+        'timetable_violations': remaining,
+        # Repaired class_groups need fresh files
+        'reused_class_groups': [name for name in state.get('reused_class_groups') or [] if name not in changed],
+        'streamed_columns': Replace({
+            name: columns for name, columns in (state.get('streamed_columns') or {}).items() if name not in changed
+        })
+    }
+
+
+def route_on_timetable_validation(state: TimeTableState) -> str:
+    """Send offending class_groups back for regeneration while rounds remain"""
+    if not state['timetable_violations']:
+        return "convert_to_dataframes"
+    if state['validation_round'] >= max_regeneration_rounds(state):
+        print_warning("Regeneration rounds used up, writing timetables with the remaining violations")
+        return "convert_to_dataframes"
+    return "regenerate"
+
+
+def plan_targeted_regeneration(state: TimeTableState) -> dict:
+    """Drop the offending class_groups and rebuild teacher availability from the timetables that are kept"""
+    offending = offending_class_groups(state['timetable_violations'], state['timetable_data'])
+    validation_round = state['validation_round'] + 1
+    print_step(f"Regenerating {len(offending)} class_groups (round {validation_round})", "🔁")
+    print_info(f"Regenerating: {', '.join(offending)}")
     
-    # Step 3: Generate timetable matrix per class
-    class_timetables_df = {}
+    kept = {name: schedule for name, schedule in state['class_timetables'].items() if name not in offending}
+    teacher_availability = Schedule.from_class_timetables(kept, state['timetable_data']).teacher_busy_masks()
     
-    for class_name, days_data in all_classes.items():
-        # Create empty matrix with days as rows, sorted time slots as columns
-        df = pd.DataFrame(index=["Monday", "Tuesday", "Wednesday", "Thursday", "Friday"],
-                          columns=sorted_time_slots)
-        
-        for day, periods in days_data.items():
-            for period in periods:
-                time_range = f"{period['start']} - {period['end']}"
-                if period["subject"]:
-                    subject = period["subject"]["name"]
-                    value = subject
-                else:
-                    value = period["type"].capitalize()
-                
-                df.loc[day, time_range] = value
-        
-        df.fillna("", inplace=True)
-        class_timetables_df[class_name] = df
+    # The reducers merge by default, so replace the channels outright
+    return {
+        'class_timetables': Replace(kept),
+        'teacher_availability': Replace(teacher_availability),
+        'validation_round': validation_round,
+        'all_grades': offending,
+        'current_grade_index': 0,
+        'reused_class_groups': [name for name in state.get('reused_class_groups') or [] if name not in offending],
+        'streamed_columns': Replace({
+            name: columns for name, columns in (state.get('streamed_columns') or {}).items() if name not in offending
+        })
+    }
+
+
+def build_timetable_frames(class_timetables: dict, timetable_data: dict) -> dict:
+    """Pack class timetables into a Schedule and read one days x time-slots DataFrame per class off its array"""
+    return Schedule.from_class_timetables(class_timetables, timetable_data).class_frames()
+
+
+def build_teacher_frames(class_timetables: dict, timetable_data: dict, time_slots=None) -> dict:
+    """Invert class timetables into one days x time-slots DataFrame per teacher"""
+    return Schedule.from_class_timetables(class_timetables, timetable_data).teacher_frames(time_slots)
+
+
+def convert_to_dataframes(state: TimeTableState) -> dict:
+    """Convert class timetables to pandas DataFrames"""
+    print_step("Converting timetables to DataFrames", "📊")
     
-    state['class_timetables_df'] = class_timetables_df
+    class_timetables_df = build_timetable_frames(state['class_timetables'], state['timetable_data'])
     print_success("DataFrames created successfully!")
-    return state
+    return {'class_timetables_df': class_timetables_df}
+
+
+def teacher_timetables_enabled() -> bool:
+    return os.getenv("TEACHER_TIMETABLES", "true").lower() in ("1", "true", "yes")
+
+
+def build_teacher_timetables(state: TimeTableState) -> dict:
+    """Invert the class timetables into per-teacher timetables, without any LLM calls"""
+    if not teacher_timetables_enabled():
+        return {'teacher_timetables': {}, 'teacher_timetables_df': {}}
+    print_step("Building teacher timetables", "🧑‍🏫")
+
+    schedule = Schedule.from_class_timetables(state['class_timetables'], state['timetable_data'])
+    class_timetables_df = state.get('class_timetables_df') or {}
+    # Teacher frames use the class frames' time slots, so every file shares one set of columns
+    time_slots = next(iter(class_timetables_df.values())).columns if class_timetables_df else None
+    teacher_timetables_df = schedule.teacher_frames(time_slots)
+
+    print_success(f"Built timetables for {len(teacher_timetables_df)} teachers")
+    return {'teacher_timetables': schedule.teacher_timetables(), 'teacher_timetables_df': teacher_timetables_df}
+
+
+def class_group_file_paths(output_dir: str, class_group: str) -> tuple:
+    """Return the (PNG, CSV, XLSX) paths of one class_group's timetable files"""
+    safe_class_name = safe_filename(class_group)
+    return (
+        f"{output_dir}/{safe_class_name}_timetable.png",
+        f"{output_dir}/{safe_class_name}_timetable.csv",
+        f"{output_dir}/{safe_class_name}_timetable.xlsx"
+    )
+
+
+def teacher_file_paths(output_dir: str, teacher: str) -> tuple:
+    """Return the (PNG, CSV, XLSX) paths of one teacher's timetable files, kept apart from the class files"""
+    return class_group_file_paths(os.path.join(output_dir, "teachers"), teacher)
+
+
+def teacher_image_dpi():
+    """Teacher image resolution from TEACHER_IMAGE_DPI, or None to use TIMETABLE_IMAGE_DPI"""
+    dpi = os.getenv("TEACHER_IMAGE_DPI")
+    return int(dpi) if dpi else None
 
 
-def generate_timetable_files(state: TimeTableState) -> TimeTableState:
+def remove_stale_teacher_files(teacher_frames: dict, output_dir: str):
+    """Delete timetable files under teachers/ left by teachers who no longer teach any class_group"""
+    teachers_dir = os.path.join(output_dir, "teachers")
+    current = {
+        os.path.basename(path) for teacher in teacher_frames for path in teacher_file_paths(output_dir, teacher)
+    }
+    stale = [
+        name for name in os.listdir(teachers_dir)
+        if name.endswith(("_timetable.png", "_timetable.csv", "_timetable.xlsx")) and name not in current
+    ]
+    for name in stale:
+        os.remove(os.path.join(teachers_dir, name))
+    if stale:
+        print_info(f"Removed {len(stale)} files of teachers no longer in the timetables")
+
+
+def regenerated_teachers(state: TimeTableState) -> set:
+    """Return the teachers of every class_group whose timetable was generated or repaired this run"""
+    reused_class_groups = set(state.get('reused_class_groups') or [])
+    return {
+        subject['teacher'] for group in state['timetable_data']['class_groups']
+        if group['name'] not in reused_class_groups
+        for subject in group.get('subjects') or [] if subject.get('teacher')
+    }
+
+
+def teacher_files_current(df, paths: tuple) -> bool:
+    """Whether a teacher's files exist and their CSV already holds this frame"""
+    if not all(os.path.exists(path) for path in paths):
+        return False
+    with open(paths[1], encoding="utf-8") as csv:
+        return csv.read() == df.to_csv(index=True)
+
+
+def write_teacher_files(teacher_frames: dict, output_dir: str, per_teacher_excel: bool, changed_teachers=None) -> list[str]:
+    """Write each teacher's PNG, CSV and (optionally) Excel file; returns the files written or kept.
+
+    A teacher's previous files are kept when none of their class_groups changed
+    (changed_teachers, if given) or when their CSV already holds the same frame.
+    Files of teachers who are no longer in teacher_frames are deleted.
+    """
+    from create_timetable_image import render_timetable_images
+    from create_timetable_workbook import excel_sheet_name
+
+    if not teacher_frames:
+        return []
+    os.makedirs(os.path.join(output_dir, "teachers"), exist_ok=True)
+    remove_stale_teacher_files(teacher_frames, output_dir)
+    generated_files = []
+    pending_teachers = []
+    for teacher, df in teacher_frames.items():
+        paths = teacher_file_paths(output_dir, teacher)
+        expected_files = paths if per_teacher_excel else paths[:2]
+        unchanged = changed_teachers is not None and teacher not in changed_teachers
+        if (unchanged and all(os.path.exists(path) for path in expected_files)) or teacher_files_current(df, expected_files):
+            generated_files.extend(expected_files)
+        else:
+            pending_teachers.append(teacher)
+
+    render_errors = render_timetable_images(
+        [(teacher_frames[teacher], teacher, teacher_file_paths(output_dir, teacher)[0]) for teacher in pending_teachers],
+        use_colors=False,
+        dpi=teacher_image_dpi()
+    )
+    for teacher in pending_teachers:
+        df = teacher_frames[teacher]
+        png_file, csv_file, excel_file = teacher_file_paths(output_dir, teacher)
+        if render_errors.get(png_file) is None:
+            generated_files.append(png_file)
+            record_file_written(png_file)
+        else:
+            print_error(f"Failed to generate PNG for {teacher}: {str(render_errors[png_file])}")
+        try:
+            df.to_csv(csv_file, index=True)
+            generated_files.append(csv_file)
+            record_file_written(csv_file)
+            if per_teacher_excel:
+                df.to_excel(excel_file, index=True, sheet_name=excel_sheet_name(teacher, set()))
+                generated_files.append(excel_file)
+                record_file_written(excel_file)
+        except Exception as e:
+            print_error(f"Failed to generate files for {teacher}: {str(e)}")
+    if len(pending_teachers) < len(teacher_frames):
+        print_info(f"Reused files for {len(teacher_frames) - len(pending_teachers)} unchanged teachers")
+    print_success(f"Generated files for {len(pending_teachers)} teachers")
+    return generated_files
+
+
+def write_streamed_files(state: TimeTableState) -> dict:
+    """Write the PNG and CSV of every newly generated class_group straight away when streaming"""
+    if not state.get('stream_files'):
+        return {}
+    from create_timetable_image import render_timetable_images
+
+    streamed_columns = state.get('streamed_columns') or {}
+    reused_class_groups = set(state.get('reused_class_groups') or [])
+    new_class_groups = {
+        class_group: schedule for class_group, schedule in state['class_timetables'].items()
+        if class_group not in streamed_columns and class_group not in reused_class_groups
+    }
+    if not new_class_groups:
+        return {}
+
+    output_dir = get_output_dir(state)
+    os.makedirs(output_dir, exist_ok=True)
+    frames = build_timetable_frames(new_class_groups, state['timetable_data'])
+    written_columns = {}
+    render_errors = render_timetable_images(
+        [(df, class_group, class_group_file_paths(output_dir, class_group)[0]) for class_group, df in frames.items()],
+        use_colors=False
+    )
+    for class_group, df in frames.items():
+        png_file, csv_file, _ = class_group_file_paths(output_dir, class_group)
+        try:
+            df.to_csv(csv_file, index=True)
+            record_file_written(csv_file)
+        except Exception as e:
+            print_error(f"Failed to stream CSV for {class_group}: {str(e)}")
+            continue
+        if render_errors.get(png_file) is not None:
+            print_error(f"Failed to stream PNG for {class_group}: {str(render_errors[png_file])}")
+            continue
+        record_file_written(png_file)
+        # Remember the columns written, so generate_files can keep these files if the final grid matches
+        written_columns[class_group] = list(df.columns)
+        print_success(f"Streamed PNG and CSV for {class_group}")
+
+    return {'streamed_columns': written_columns}
+
+
+def generate_timetable_files(state: TimeTableState) -> dict:
     """Generate PNG, CSV, and Excel files from timetable DataFrames"""
+    # Rendering and export libraries are only loaded by the node that needs them
+    from create_timetable_image import render_timetable_images
+    from create_timetable_workbook import create_timetable_workbook, excel_sheet_name
+
     print_step("Generating timetable files", "📁")
     
     class_timetables_df = state['class_timetables_df']
     all_grades = list(class_timetables_df.keys())
     
     # Create output directory if it doesn't exist
-    import os
-    output_dir = "generated_timetables"
+    output_dir = get_output_dir(state)
     os.makedirs(output_dir, exist_ok=True)
     
     generated_files = []
+    reused_class_groups = set(state.get('reused_class_groups') or [])
+    streamed_columns = state.get('streamed_columns') or {}
+    excel_output = state.get('excel_output') or os.getenv("EXCEL_OUTPUT", "per_class")
     
+    # Work out which class_groups need new files
+    file_paths = {}
+    pending_class_groups = []
+    streamed_class_groups = set()
     for class_group in all_grades:
-        class_timetable_df = class_timetables_df[class_group]
+        file_paths[class_group] = class_group_file_paths(output_dir, class_group)
         
-        # Generate file paths
-        safe_class_name = class_group.replace(" ", "_").replace("/", "_")
-        png_file = f"{output_dir}/{safe_class_name}_timetable.png"
-        csv_file = f"{output_dir}/{safe_class_name}_timetable.csv"
-        excel_file = f"{output_dir}/{safe_class_name}_timetable.xlsx"
+        # Keep the previous run's files for class_groups that were not regenerated
+        expected_files = file_paths[class_group] if excel_output in ("per_class", "both") else file_paths[class_group][:2]
+        if class_group in reused_class_groups and all(os.path.exists(path) for path in expected_files):
+            generated_files.extend(expected_files)
+            print_info(f"Reused files for {class_group}")
+            continue
         
-        # Generate PNG image
-        try:
-            create_timetable_image(class_timetable_df, class_group, png_file, use_colors=False)
-            generated_files.append(png_file)
-            print_success(f"Generated PNG for {class_group}")
-        except Exception as e:
-            print_error(f"Failed to generate PNG for {class_group}: {str(e)}")
+        # Keep the PNG and CSV streamed during generation when the final columns are the same
+        pending_class_groups.append(class_group)
+        if streamed_columns.get(class_group) == list(class_timetables_df[class_group].columns):
+            streamed_class_groups.add(class_group)
+    
+    # Render every PNG image that was not streamed in one batch
+    render_errors = render_timetable_images(
+        [(class_timetables_df[class_group], class_group, file_paths[class_group][0])
+         for class_group in pending_class_groups if class_group not in streamed_class_groups],
+        use_colors=False
+    )
+    
+    for class_group in pending_class_groups:
+        class_timetable_df = class_timetables_df[class_group]
+        png_file, csv_file, excel_file = file_paths[class_group]
         
-        # Generate CSV file
-        try:
-            class_timetable_df.to_csv(csv_file, index=True)
-            generated_files.append(csv_file)
-            print_success(f"Generated CSV for {class_group}")
-        except Exception as e:
-            print_error(f"Failed to generate CSV for {class_group}: {str(e)}")
+        if class_group in streamed_class_groups:
+            generated_files.extend((png_file, csv_file))
+        else:
+            # Generate PNG image
+            if render_errors.get(png_file) is None:
+                generated_files.append(png_file)
+                record_file_written(png_file)
+                print_success(f"Generated PNG for {class_group}")
+            else:
+                print_error(f"Failed to generate PNG for {class_group}: {str(render_errors[png_file])}")
+            
+            # Generate CSV file
+            try:
+                class_timetable_df.to_csv(csv_file, index=True)
+                generated_files.append(csv_file)
+                record_file_written(csv_file)
+                print_success(f"Generated CSV for {class_group}")
+            except Exception as e:
+                print_error(f"Failed to generate CSV for {class_group}: {str(e)}")
         
         # Generate Excel file
+        if excel_output in ("per_class", "both"):
+            try:
+                class_timetable_df.to_excel(excel_file, index=True, sheet_name=excel_sheet_name(class_group, set()))
+                generated_files.append(excel_file)
+                record_file_written(excel_file)
+                print_success(f"Generated Excel for {class_group}")
+            except Exception as e:
+                print_error(f"Failed to generate Excel for {class_group}: {str(e)}")
+    
+    # Teacher timetables go through the same PNG, CSV and Excel paths, under teachers/
+    teacher_frames = state.get('teacher_timetables_df') or {}
+    generated_files.extend(write_teacher_files(
+        teacher_frames, output_dir, excel_output in ("per_class", "both"), regenerated_teachers(state)
+    ))
+    
+    # Write every class, plus a sheet per teacher, into a single workbook
+    if excel_output in ("workbook", "both"):
+        workbook_file = f"{output_dir}/timetables.xlsx"
         try:
-            class_timetable_df.to_excel(excel_file, index=True, sheet_name=class_group)
-            generated_files.append(excel_file)
-            print_success(f"Generated Excel for {class_group}")
+            create_timetable_workbook(
+                class_timetables_df,
+                workbook_file,
+                teacher_frames=teacher_frames,
+                write_only=os.getenv("EXCEL_WRITE_ONLY", "true").lower() in ("1", "true", "yes")
+            )
+            generated_files.append(workbook_file)
+            record_file_written(workbook_file)
+            print_success(f"Generated workbook {workbook_file}")
         except Exception as e:
-            print_error(f"Failed to generate Excel for {class_group}: {str(e)}")
-    
-    # Store generated files in state
-    state['generated_files'] = generated_files
+            print_error(f"Failed to generate workbook: {str(e)}")
     
     # Display summary
     file_summary = {
         "Classes Processed": str(len(all_grades)),
+        "Classes Reused": str(len(reused_class_groups)),
+        "Classes Streamed": str(len(streamed_class_groups)),
+        "Teachers": str(len(teacher_frames)),
         "PNG Files": str(len([f for f in generated_files if f.endswith('.png')])),
         "CSV Files": str(len([f for f in generated_files if f.endswith('.csv')])),
         "Excel Files": str(len([f for f in generated_files if f.endswith('.xlsx')])),
+        "Excel Output": excel_output,
         "Output Directory": output_dir
     }
     print_status_panel("File Generation Summary", file_summary)
     
     print_success("All timetable files generated successfully!")
-    return state
+    return {'generated_files': generated_files}
 
 
-# WORKFLOW SETUP
-workflow = StateGraph(TimeTableState)
-
-# Add nodes
-workflow.add_node('get_timetable_data', get_timetable_data)
-workflow.add_node('validate_timetable_data', validate_timetable_data)
-workflow.add_node('invalid', invalid)
-workflow.add_node('initialize_sequential', initialize_sequential_processing)
-workflow.add_node('generate_single_class_group', generate_single_class_group)
-workflow.add_node('update_teacher_availability', update_teacher_availability)
-workflow.add_node('increment_class_group', increment_class_group_index)
-workflow.add_node('convert_to_dataframes', convert_to_dataframes)
-workflow.add_node('generate_files', generate_timetable_files)
-
-# Add edges
-workflow.add_edge(START, 'get_timetable_data')
-workflow.add_edge('get_timetable_data', 'validate_timetable_data')
-workflow.add_conditional_edges(
-    'validate_timetable_data',
-    route_on_validation,
-    {
-        "valid": 'initialize_sequential',
-        "invalid": "invalid"
-    }
-)
-workflow.add_edge('initialize_sequential', 'generate_single_class_group')
-workflow.add_edge('generate_single_class_group', 'update_teacher_availability')
-workflow.add_edge('update_teacher_availability', 'increment_class_group')
-workflow.add_conditional_edges(
-    'increment_class_group',
-    route_next_class_group,
-    {
-        "continue": "generate_single_class_group",
-        "convert_to_dataframes": "convert_to_dataframes"
+def save_run_state(state: TimeTableState) -> dict:
+    """Persist this run's data and timetables for incremental regeneration"""
+    save_run(
+        get_output_dir(state),
+        state['timetable_data'],
+        state['class_timetables']
+    )
+    record_file_written(run_state_path(get_output_dir(state)))
+    return {}
+
+
+# ASYNC WORKFLOW FUNCTIONS
+# Rendering already fans out to a process pool, so concurrent jobs take turns
+_render_lock = threading.Lock()
+
+
+async def aget_timetable_data(state: TimeTableState) -> dict:
+    """Extract structured timetable data from user input without blocking the event loop."""
+    print_step("Extracting data into structured table", "📊")
+    structured_output_llm = get_structured_llm().with_structured_output(TimetableData)
+    response: TimetableData = await structured_output_llm.ainvoke([
+        SystemMessage(content=GET_TIMETABLE_SYSTEM_PROMPT),
+        HumanMessage(content=state["input"])
+    ])
+    print_success("Done extracting data!")
+
+    return {"timetable_data": build_period_grid(response.model_dump())}
+
+
+async def arequest_class_group_schedule(class_group_name: str, timetable_data: dict, messages: list, lenient: bool = False) -> dict:
+    """Async counterpart of request_class_group_schedule"""
+    if not stream_parsing_enabled():
+        parse = completion_parser(class_group_name)
+        return parse(await get_llm().ainvoke(messages, validate=parse))
+
+    parser = new_schedule_parser(class_group_name, timetable_data, lenient)
+    chunks = get_llm().astream(messages, validate=lambda response: parser.result())
+    try:
+        async for chunk in chunks:
+            parser.feed(chunk_text(chunk))
+    finally:
+        await chunks.aclose()
+    return streamed_schedule(class_group_name, parser)
+
+
+async def allm_generate_class_group(class_group_name: str, timetable_data: dict, teacher_availability: dict) -> dict:
+    """Ask the LLM for a single class_group's weekly schedule asynchronously, re-asking when it is malformed"""
+    messages = build_class_group_messages(class_group_name, timetable_data, teacher_availability)
+    for attempt in range(1, generation_attempts() + 1):
+        try:
+            return await arequest_class_group_schedule(
+                class_group_name, timetable_data, messages, lenient=attempt == generation_attempts()
+            )
+        except (ValueError, KeyError) as e:
+            error = e
+            report_discarded_completion(class_group_name, attempt, e)
+    raise error
+
+
+async def agenerate_single_class_group(state: TimeTableState) -> dict:
+    """Generate timetable for current class_group only, asynchronously"""
+    current_class_group = state['all_grades'][state['current_grade_index']]
+    print_step(f"Generating timetable for {current_class_group}", "🎯")
+
+    schedule = await allm_generate_class_group(
+        current_class_group, state['timetable_data'], state['teacher_availability']
+    )
+
+    print_success(f"Done generating {current_class_group}!")
+    return {'class_timetables': {current_class_group: schedule}}
+
+
+async def agenerate_class_group_task(task: dict) -> dict:
+    """Generate one class_group of a wave asynchronously"""
+    if task['generation_engine'] == "solver":
+        # The solver is CPU-bound, so it runs in a worker thread instead of blocking other jobs
+        return await asyncio.to_thread(generate_class_group_task, task)
+
+    class_group = task['class_group']
+    print_info(f"Generating {class_group} ({task['generation_engine']})")
+    schedule = await allm_generate_class_group(class_group, task['timetable_data'], task['teacher_availability'])
+
+    print_success(f"Done generating {class_group}!")
+    return {
+        'class_timetables': {class_group: schedule},
+        'teacher_availability': collect_teacher_busy_times(schedule, task['timetable_data'])
     }
-)
-workflow.add_edge('convert_to_dataframes', 'generate_files')
-workflow.add_edge('generate_files', END)
 
 
-# Compile workflow
-graph = workflow.compile()
+def in_thread(node):
+    """Async version of a sync node that runs it in a worker thread
+
+    LangGraph calls a sync node inline on the event loop, so in the async graph
+    solving, validation, repair and file I/O would block every other job.
+    """
+    @functools.wraps(node)
+    async def run(state):
+        return await asyncio.to_thread(node, state)
+    return run
+
+
+async def aconvert_to_dataframes(state: TimeTableState) -> dict:
+    """Convert class timetables to DataFrames in a worker thread"""
+    return await asyncio.to_thread(convert_to_dataframes, state)
+
+
+async def abuild_teacher_timetables(state: TimeTableState) -> dict:
+    """Build teacher timetables in a worker thread"""
+    return await asyncio.to_thread(build_teacher_timetables, state)
+
+
+async def awrite_streamed_files(state: TimeTableState) -> dict:
+    """Write streamed class_group files in a worker thread, one job rendering at a time"""
+    def write_locked():
+        with _render_lock:
+            return write_streamed_files(state)
+
+    return await asyncio.to_thread(write_locked)
+
+
+async def agenerate_timetable_files(state: TimeTableState) -> dict:
+    """Write timetable files in a worker thread, one job rendering at a time"""
+    def generate_locked():
+        with _render_lock:
+            return generate_timetable_files(state)
+
+    return await asyncio.to_thread(generate_locked)
+
+
+# WORKFLOW SETUP
+def build_workflow(use_async: bool = False) -> StateGraph:
+    """Build the timetable workflow with either the sync or the asyncio-native nodes."""
+    workflow = StateGraph(TimeTableState)
+
+    def add_node(name, node):
+        # Every node is traced, so its time, tokens, cache hits and bytes written show up in the run summary
+        workflow.add_node(name, traced_node(name, node))
+
+    # Sync nodes that do real work run in worker threads in the async graph; bookkeeping nodes stay inline
+    threaded = in_thread if use_async else (lambda node: node)
+
+    # Add nodes
+    add_node('get_timetable_data', aget_timetable_data if use_async else get_timetable_data)
+    add_node('validate_timetable_data', validate_timetable_data)
+    add_node('invalid', invalid)
+    add_node('initialize_sequential', initialize_sequential_processing)
+    add_node('plan_incremental', threaded(plan_incremental_regeneration))
+    add_node('generate_single_class_group', agenerate_single_class_group if use_async else generate_single_class_group)
+    add_node('solve_single_class_group', threaded(solve_single_class_group))
+    add_node('update_teacher_availability', threaded(update_teacher_availability))
+    add_node('stream_class_group_files', awrite_streamed_files if use_async else write_streamed_files)
+    add_node('increment_class_group', increment_class_group_index)
+    add_node('plan_parallel_waves', plan_parallel_waves)
+    add_node('generate_class_group_task', agenerate_class_group_task if use_async else generate_class_group_task)
+    add_node('stream_wave_files', awrite_streamed_files if use_async else write_streamed_files)
+    add_node('merge_wave', merge_wave)
+    add_node('validate_timetables', threaded(validate_generated_timetables))
+    add_node('repair_timetables', threaded(repair_generated_timetables))
+    add_node('plan_regeneration', threaded(plan_targeted_regeneration))
+    add_node('convert_to_dataframes', aconvert_to_dataframes if use_async else convert_to_dataframes)
+    add_node('build_teacher_timetables', abuild_teacher_timetables if use_async else build_teacher_timetables)
+    add_node('generate_files', agenerate_timetable_files if use_async else generate_timetable_files)
+    add_node('save_run', threaded(save_run_state))
+
+    # Add edges
+    workflow.add_edge(START, 'get_timetable_data')
+    workflow.add_edge('get_timetable_data', 'validate_timetable_data')
+    workflow.add_conditional_edges(
+        'validate_timetable_data',
+        route_on_validation,
+        {
+            "valid": 'initialize_sequential',
+            "invalid": "invalid"
+        }
+    )
+    workflow.add_edge('initialize_sequential', 'plan_incremental')
+    workflow.add_conditional_edges(
+        'plan_incremental',
+        route_generation_mode,
+        {
+            "llm": "generate_single_class_group",
+            "solver": "solve_single_class_group",
+            "parallel": "plan_parallel_waves",
+            "validate_timetables": "validate_timetables"
+        }
+    )
+    workflow.add_edge('generate_single_class_group', 'update_teacher_availability')
+    workflow.add_edge('solve_single_class_group', 'update_teacher_availability')
+    workflow.add_edge('update_teacher_availability', 'stream_class_group_files')
+    workflow.add_edge('stream_class_group_files', 'increment_class_group')
+    workflow.add_conditional_edges(
+        'increment_class_group',
+        route_next_class_group,
+        {
+            "llm": "generate_single_class_group",
+            "solver": "solve_single_class_group",
+            "validate_timetables": "validate_timetables"
+        }
+    )
+    for wave_node in ('plan_parallel_waves', 'merge_wave'):
+        workflow.add_conditional_edges(
+            wave_node,
+            dispatch_wave,
+            ['generate_class_group_task', 'validate_timetables']
+        )
+    workflow.add_edge('generate_class_group_task', 'stream_wave_files')
+    workflow.add_edge('stream_wave_files', 'merge_wave')
+    workflow.add_conditional_edges(
+        'validate_timetables',
+        route_after_timetable_validation,
+        {
+            "repair": "repair_timetables",
+            "convert_to_dataframes": "convert_to_dataframes"
+        }
+    )
+    workflow.add_conditional_edges(
+        'repair_timetables',
+        route_on_timetable_validation,
+        {
+            "regenerate": "plan_regeneration",
+            "convert_to_dataframes": "convert_to_dataframes"
+        }
+    )
+    workflow.add_conditional_edges(
+        'plan_regeneration',
+        route_generation_mode,
+        {
+            "llm": "generate_single_class_group",
+            "solver": "solve_single_class_group",
+            "parallel": "plan_parallel_waves",
+            "validate_timetables": "validate_timetables"
+        }
+    )
+    workflow.add_edge('convert_to_dataframes', 'build_teacher_timetables')
+    workflow.add_edge('build_teacher_timetables', 'generate_files')
+    workflow.add_edge('generate_files', 'save_run')
+    workflow.add_edge('save_run', END)
+    return workflow
+
+
+def compile_workflow(workflow: StateGraph, checkpointer=None):
+    """Compile a workflow with a recursion limit large enough for big schools (GRAPH_RECURSION_LIMIT)"""
+    # Sequential generation takes several steps per class_group, far beyond LangGraph's default of 25
+    recursion_limit = int(os.getenv("GRAPH_RECURSION_LIMIT", "10000"))
+    return workflow.compile(checkpointer=checkpointer).with_config(recursion_limit=recursion_limit)
+
+
+workflow = build_workflow()
+
+# Compile workflows
+graph = compile_workflow(workflow)
+async_graph = compile_workflow(build_workflow(use_async=True))
+
+# Bounded concurrency for run_timetable, one semaphore per event loop
+_job_semaphores = weakref.WeakKeyDictionary()
+
+
+def get_job_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore limiting concurrent timetable jobs on the running loop"""
+    loop = asyncio.get_running_loop()
+    if loop not in _job_semaphores:
+        _job_semaphores[loop] = asyncio.Semaphore(int(os.getenv("MAX_CONCURRENT_JOBS", "4")))
+    return _job_semaphores[loop]
+
+
+async def run_timetable(input: str, **options) -> TimeTableState:
+    """Run one timetable job on the async graph, waiting for a free job slot first.
+
+    Args:
+        input (str): Natural language description of the school
+        **options: Extra initial state, e.g. generation_engine or output_dir
+
+    Returns:
+        TimeTableState: Final workflow state
+    """
+    async with get_job_semaphore():
+        return await async_graph.ainvoke({"input": input, **options})
+
+
+class StreamProgress:
+    """Drive a Rich progress bar from streamed graph updates and announce each finished class_group"""
+
+    def __init__(self, progress):
+        self.progress = progress
+        self.task = progress.add_task("[cyan]Generating class timetables...", total=None)
+        self.done = set()
+        self.state = {}
+
+    def update(self, mode: str, chunk: dict):
+        if mode == "values":
+            self.state = chunk
+            return
+        for node, node_update in chunk.items():
+            if node in ('initialize_sequential', 'plan_incremental') and 'all_grades' in (node_update or {}):
+                self.progress.update(self.task, total=len(node_update['all_grades']))
+            elif node in ('stream_class_group_files', 'stream_wave_files'):
+                for class_group in node_update.get('streamed_columns') or {}:
+                    if class_group not in self.done:
+                        self.done.add(class_group)
+                        self.progress.update(self.task, advance=1)
+                        print_success(f"{class_group} timetable ready")
+
+
+def stream_timetable(input, config=None, compiled_graph=None, **options) -> TimeTableState:
+    """Run the graph with graph.stream, writing each class_group's files as soon as it is generated.
+
+    Args:
+        input (str): Natural language description of the school, or None to resume a checkpointed thread
+        config (dict): Graph config, e.g. the thread of a checkpointed run
+        compiled_graph: Graph to stream (default: graph)
+        **options: Extra initial state, e.g. generation_engine or output_dir
+
+    Returns:
+        TimeTableState: Final workflow state
+    """
+    graph_input = None if input is None else {"input": input, "stream_files": True, **options}
+    with create_progress_bar() as progress:
+        tracker = StreamProgress(progress)
+        for mode, chunk in (compiled_graph or graph).stream(
+            graph_input, config, stream_mode=["updates", "values"]
+        ):
+            tracker.update(mode, chunk)
+    return tracker.state
+
+
+async def astream_timetable(input: str, **options) -> TimeTableState:
+    """Async counterpart of stream_timetable on the async graph, sharing run_timetable's job slots"""
+    async with get_job_semaphore():
+        with create_progress_bar() as progress:
+            tracker = StreamProgress(progress)
+            async for mode, chunk in async_graph.astream(
+                {"input": input, "stream_files": True, **options}, stream_mode=["updates", "values"]
+            ):
+                tracker.update(mode, chunk)
+        return tracker.state
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate school timetables from a natural language prompt")
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the on-disk LLM response cache")
+    parser.add_argument("--clear-cache", action="store_true", help="Clear the LLM response cache before running")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only regenerate class groups whose inputs changed since the previous run")
+    parser.add_argument("--stream", action="store_true",
+                        help="Show live progress and write each class timetable as soon as it is generated")
+    parser.add_argument("--resume", metavar="ID",
+                        help="Resume an interrupted run from its last checkpoint instead of starting a new one")
+    parser.add_argument("--checkpoint-db", default=checkpoint_db_path(),
+                        help="SQLite database the run's checkpoints are saved to")
+    parser.add_argument("--trace-file", default=os.getenv("TRACE_FILE", "generated_timetables/run_trace.json"),
+                        help="Where to export per-node timings (.json, or .prom/.om for OpenMetrics)")
+    args = parser.parse_args()
+
+    llm_cache = get_cache()
+    if args.clear_cache:
+        llm_cache.clear()
+        print_info("LLM cache cleared")
+    if args.no_cache:
+        llm_cache.enabled = False
+
     # Display application banner
     print_banner(
         title="SKEJUL-AI",
@@ -389,22 +1284,61 @@ if __name__ == "__main__":
     )
     
     
+    # Every completed step is checkpointed under the run's thread id
+    checkpointed_graph = compile_workflow(workflow, create_checkpointer(args.checkpoint_db))
+    thread_id = args.resume or new_thread_id(USER_PROMPT)
+    config = thread_config(thread_id)
+    if args.resume:
+        saved = checkpointed_graph.get_state(config)
+        if not saved.values:
+            print_error(f"No checkpoint found for run {thread_id} in {args.checkpoint_db}")
+            raise SystemExit(1)
+        print_info(f"Resuming run {thread_id} before {', '.join(saved.next) or 'the end'}")
+    else:
+        print_info(f"Run id: {thread_id}")
+    
     # Execute workflow
-    result = graph.invoke({"input": USER_PROMPT})
+    tracer = get_tracer()
+    tracer.reset()
+    run_options = {"incremental": args.incremental or None}
+    try:
+        if args.stream:
+            result = stream_timetable(None if args.resume else USER_PROMPT, config, checkpointed_graph, **run_options)
+        else:
+            graph_input = None if args.resume else {"input": USER_PROMPT, **run_options}
+            result = checkpointed_graph.invoke(graph_input, config)
+    except Exception:
+        print_error(f"Run {thread_id} stopped. Resume it with: python main.py --resume {thread_id}")
+        raise
     
     # Output results with nice formatting - show summary instead of full timetables
     class_names = list(result['class_timetables'].keys())
     total_classes = len(class_names)
     
+    cache_stats = llm_cache.stats()
+    cache_info = (
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+        if llm_cache.enabled else "bypassed"
+    )
+    
     summary_info = (
         f"Classes Generated: {total_classes}\n"
+        f"Classes Reused: {len(result.get('reused_class_groups') or [])}\n"
+        f"Violations Remaining: {len(result.get('timetable_violations') or [])}\n"
         f"Classes: {', '.join(class_names)}\n"
+        f"Teacher Timetables: {len(result.get('teacher_timetables') or {})}\n"
         f"Files Location: generated_timetables/\n"
+        f"LLM Cache: {cache_info}\n"
         f"Status: ✅ Complete"
     )
     
     print_result_box("Timetable Generation Summary", summary_info)
     
+    # Per-node timings, tokens, cache hits and bytes written
+    tracer.export(args.trace_file)
+    print_table("Run Trace", TABLE_HEADERS, tracer.table_rows())
+    print_info(f"Trace written to {args.trace_file}")
+    
     # Display completion message
     print_completion_message("Skejul-AI", "Your Intelligent Scheduling Assistant")
     
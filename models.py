@@ -1,5 +1,7 @@
 from pydantic import BaseModel, Field
-from typing import List, TypedDict, Optional, Literal
+from typing import Annotated, List, TypedDict, Optional, Literal
+
+from availability import merge_masks
 
 
 # Type aliases
@@ -39,7 +41,12 @@ class TimetableData(BaseModel):
     days: Optional[List[DayOfWeek]] = Field(None, description="List of school days")
     start_time: Optional[str] = Field(None, description="School start time (e.g., '7:20 AM', '07:20')")
     end_time: Optional[str] = Field(None, description="School end time (e.g., '3:50 PM', '15:50')")
-    periods: Optional[List[TimePeriod]] = Field(None, description="Each subject period with start and end time")
+    periods: Optional[List[TimePeriod]] = Field(
+        None,
+        description="Fixed events of the school day (assembly, breaks, lunch, prayer, activities) with start and end"
+        " time; class periods are generated locally from period_duration"
+    )
+    period_duration: Optional[int] = Field(None, description="Length of one class period in minutes, e.g. 40")
     class_groups: Optional[List[ClassGroup]] = Field(
         None,
         description="List of class_groups (E.g., ['Primary 1', 'Primary 2', 'SS1A'])"
@@ -47,17 +54,64 @@ class TimetableData(BaseModel):
     )
 
 
+# STATE REDUCERS
+class Replace:
+    """Wrap a channel update so its reducer replaces the current value instead of merging into it."""
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+
+def merge_dicts(current: dict, update: dict) -> dict:
+    """Merge the keys a node returns into a dict channel, e.g. one class_group's timetable."""
+    if isinstance(update, Replace):
+        return update.value
+    return {**(current or {}), **(update or {})}
+
+
+def merge_teacher_availability(current: dict, update: dict) -> dict:
+    """Bitwise-OR the teacher busy masks a node returns into the current ones."""
+    if isinstance(update, Replace):
+        return update.value
+    return merge_masks(current, update)
+
+
 # STATE DEFINITIONS
 class TimeTableState(TypedDict):
-    """State structure for the timetable generation workflow."""
+    """State structure for the timetable generation workflow.
+
+    Nodes return only the keys they change. Annotated channels are merged by
+    their reducer, so a per-class_group step writes one entry instead of
+    rewriting every timetable generated so far.
+    """
     input: str
     timetable_data: TimetableData
-    class_timetables: dict
+    class_timetables: Annotated[dict, merge_dicts]
     class_timetables_df: dict
+    teacher_timetables: dict  # Teacher -> {day: [lesson, ...]}, inverted from class_timetables
+    teacher_timetables_df: dict
+    generated_files: list[str]
+    output_dir: str  # Defaults to generated_timetables/
+    excel_output: str  # "per_class", "workbook" or "both"
     attempt: int
     validation_errors: list[str]
     validated: bool
     # Fields for sequential processing
-    teacher_availability: dict[str, list[str]]  # Teacher -> ["Mon 8:00-8:40", "Tue 9:00-9:40"]
+    teacher_availability: Annotated[dict[str, list[int]], merge_teacher_availability]  # Teacher -> per-day busy period bitmasks
     current_grade_index: int  # Track which class_group we're processing
-    all_grades: list[str]  # List of all class_groups to process
\ No newline at end of file
+    all_grades: list[str]  # List of all class_groups to process
+    generation_engine: str  # "llm" or "solver" for per-class_group generation
+    # Fields for parallel processing
+    generation_mode: str  # "sequential" or "parallel"
+    waves: list[list[str]]  # Teacher-disjoint class_group waves
+    current_wave_index: int  # Track which wave we're processing
+    # Fields for incremental regeneration
+    incremental: bool  # Reuse unchanged class_groups from the previous run
+    reused_class_groups: list[str]  # Class_groups copied from the previous run
+    # Fields for streamed file output
+    stream_files: bool  # Write each class_group's PNG and CSV as soon as it is generated
+    streamed_columns: Annotated[dict[str, list[str]], merge_dicts]  # Class group -> time slots of its streamed files
+    # Fields for timetable validation
+    timetable_violations: list[dict]  # Clash, grid, quota and missing records from find_violations
+    validation_round: int  # Targeted regeneration rounds used so far
\ No newline at end of file
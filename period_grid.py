@@ -0,0 +1,98 @@
+"""
+Local expansion of the school's period grid.
+
+Extraction only returns the fixed events of the school day (assembly,
+breaks, lunch, prayer, activities) and the length of a class period.
+expand_period_grid fills every gap between the school start, the fixed
+events and the school end with back-to-back class periods, working in
+integer minutes. A gap shorter than one class period is left free. Every
+time is then written back in one canonical "HH:MM AM" format, so the model
+no longer spends output tokens on class blocks, and later stages never
+compare "07:30", "7:30 AM" and "07:30 AM" as different times.
+"""
+
+from utils import parse_clock_time
+
+MINUTES_PER_DAY = 24 * 60
+
+
+def format_clock_time(minutes: int) -> str:
+    """Format minutes after midnight as the canonical "HH:MM AM" clock time"""
+    hour, minute = divmod(minutes % MINUTES_PER_DAY, 60)
+    return f"{(hour % 12) or 12:02d}:{minute:02d} {'AM' if hour < 12 else 'PM'}"
+
+
+def to_minutes(text: str, not_before=None) -> int:
+    """Parse a clock time into minutes after midnight
+
+    Args:
+        text (str): Clock time such as "07:30", "7:30 AM" or "15:50"
+        not_before (int): Minutes the time cannot be earlier than; a time without
+            AM/PM that would be earlier is read as PM, e.g. "04:00" after a 07:20 start
+
+    Returns:
+        int: Minutes after midnight
+    """
+    minutes = parse_clock_time(text)
+    has_meridiem = any(marker in text.upper() for marker in ("AM", "PM"))
+    if not_before is not None and not has_meridiem and minutes < not_before and minutes < 12 * 60:
+        minutes += 12 * 60
+    return minutes
+
+
+def expand_period_grid(timetable_data: dict) -> dict:
+    """Build the canonical period grid of extracted TimetableData
+
+    When period_duration is known, any class periods the model listed are
+    replaced by ones generated between the fixed events. Without it, the
+    listed periods are kept and only their times are normalised.
+
+    Args:
+        timetable_data (dict): TimetableData.model_dump() from extraction
+
+    Returns:
+        dict: A copy with canonical start_time, end_time and time-ordered periods
+
+    Raises:
+        ValueError: A time could not be parsed
+    """
+    data = dict(timetable_data)
+    start = to_minutes(data['start_time']) if data.get('start_time') else None
+    end = to_minutes(data['end_time'], start) if data.get('end_time') else None
+    duration = data.get('period_duration')
+    expand = bool(duration) and start is not None and end is not None
+
+    periods = []
+    seen = set()
+    for period in data.get('periods') or []:
+        if expand and period.get('type') == 'class':
+            continue
+        period_start = to_minutes(period['start'], start)
+        period_end = to_minutes(period['end'], period_start)
+        key = (period.get('type'), period_start, period_end)
+        if key not in seen:
+            seen.add(key)
+            periods.append({'type': period.get('type') or 'other', 'start': period_start, 'end': period_end})
+    periods.sort(key=lambda period: (period['start'], period['end']))
+
+    if expand:
+        grid = []
+        cursor = start
+        for event in periods + [{'type': None, 'start': end, 'end': end}]:
+            while cursor + duration <= event['start']:
+                grid.append({'type': 'class', 'start': cursor, 'end': cursor + duration})
+                cursor += duration
+            if event['type'] is not None:
+                grid.append(event)
+            cursor = max(cursor, event['end'])
+        periods = grid
+
+    if start is not None:
+        data['start_time'] = format_clock_time(start)
+    if end is not None:
+        data['end_time'] = format_clock_time(end)
+    data['periods'] = [
+        {'type': period['type'], 'start': format_clock_time(period['start']), 'end': format_clock_time(period['end'])}
+        for period in periods
+    ]
+    return data
@@ -0,0 +1,55 @@
+"""
+Compact encoding of the per-class_group generation prompt.
+
+The period grid is sent once as [type, start, end] rows, subjects as
+[name, teacher, slots_per_week] rows, and teacher constraints only for the
+teachers of the class_group being generated, as 1-based period numbers.
+The payload is serialised without indentation, so a prompt's size no longer
+grows with the number of class groups already scheduled.
+"""
+
+import json
+
+from availability import SlotIndex, TeacherAvailability
+
+
+def encode_class_group_payload(class_group: dict, timetable_data: dict, teacher_availability: dict) -> dict:
+    """Build the compact generation payload for one class_group
+
+    Args:
+        class_group (dict): The class_group's entry in TimetableData.class_groups
+        timetable_data (dict): Extracted TimetableData
+        teacher_availability (dict): Teacher -> per-day busy bitmasks from earlier class_groups
+
+    Returns:
+        dict: JSON-serialisable payload
+    """
+    subjects = class_group.get('subjects') or []
+    teachers = {subject['teacher'] for subject in subjects if subject.get('teacher')}
+    availability = TeacherAvailability(SlotIndex.from_timetable_data(timetable_data), teacher_availability)
+    return {
+        'days': timetable_data['days'],
+        'periods': [[period['type'], period['start'], period['end']] for period in timetable_data['periods']],
+        'class_group': class_group['name'],
+        'subjects': [[subject['name'], subject.get('teacher'), subject.get('slots_per_week')] for subject in subjects],
+        'teacher_constraints': availability.to_prompt(teachers)
+    }
+
+
+def dumps_payload(payload: dict) -> str:
+    """Serialise a payload without whitespace"""
+    return json.dumps(payload, separators=(",", ":"))
+
+
+def decode_class_group_payload(payload: dict):
+    """Turn a compact payload back into (class_group, days, periods, TeacherAvailability)"""
+    periods = [{'type': type_, 'start': start, 'end': end} for type_, start, end in payload['periods']]
+    class_group = {
+        'name': payload['class_group'],
+        'subjects': [
+            {'name': name, 'teacher': teacher, 'slots_per_week': slots_per_week}
+            for name, teacher, slots_per_week in payload['subjects']
+        ]
+    }
+    availability = TeacherAvailability.from_prompt(SlotIndex(payload['days'], periods), payload['teacher_constraints'])
+    return class_group, payload['days'], periods, availability
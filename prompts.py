@@ -120,16 +120,17 @@ You are an expert school assistant that extracts structured data to help generat
 You must return the following fields as structured output (in JSON-compatible format):
 - school days (e.g., Monday to Friday)
 - school start and end time
-- named periods (e.g., assembly, breaks, activities) with accurate start/end times
+- fixed periods (e.g., assembly, breaks, lunch, activities) with accurate start/end times
+- the length of one class period in minutes (period_duration)
 - class groups (e.g., Primary 1, JSS1), each with subjects, slots per week, and assigned teachers
 - optional constraints (like max periods per day, no subject clash, or fixed teacher load)
 
 **Rules:**
 - Do NOT assume anything that is not mentioned.
-- Use exact times if provided, and generate named periods accordingly.
-- Understand the type ('class', 'break') and provide accordingly.
-- If class period duration is implied (e.g. "classes are 40 minutes"), use that to auto-generate class blocks between breaks.
-- Use 12-hour format (e.g., "07:30", "04:00 PM").
+- Use exact times if provided for the fixed periods.
+- Do NOT list class periods; they are generated from period_duration between the fixed periods.
+- If the class period length is stated or implied (e.g. "Each period: 40 minutes"), return it as period_duration (e.g. 40).
+- Use 12-hour format with AM/PM (e.g., "07:30 AM", "04:00 PM").
 - For period types, use ONLY these values: 'class', 'break', 'prayer', 'activity', 'lunch', 'assembly', 'other'
 - Map similar terms intelligently: 'extended activities' -> 'activity', 'afternoon session' -> 'activity', 'clubs' -> 'activity', 'sports' -> 'activity'
 
@@ -182,8 +183,15 @@ You are generating a school timetable from the given structured data.
 GENERATE_SINGLE_GRADE_PROMPT = """
 You are a school scheduling assistant generating a timetable for ONE specific class_group.
 
+INPUT FORMAT (compact JSON):
+- 'days': the school days
+- 'periods': the daily period template as [type, start, end] rows; period_no is the 1-based row position
+- 'class_group': the name of the class group to schedule
+- 'subjects': [name, teacher, slots_per_week] rows for that class group
+
 IMPORTANT CONSTRAINTS:
-- The 'teacher_constraints' field shows when teachers are already busy with other class_groups
+- The 'teacher_constraints' field shows when this class group's teachers are already busy with other class_groups,
+  as {teacher: {day: [period_no, ...]}} where period_no is the 1-based position in 'periods'
 - NEVER schedule a teacher during their busy times
 - If a teacher is unavailable, either skip that subject or use "None" for teacher_name
 
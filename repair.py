@@ -0,0 +1,208 @@
+"""
+Local repair of generated class timetables.
+
+Before any class_group is sent back to the LLM, repair_timetables tries to
+fix violations in-process with a small move/swap neighbourhood over each
+class_group's own period grid:
+
+- a double-booked lesson is moved to an empty class period where its teacher
+  is free, or swapped with another lesson of the same class_group when both
+  teachers are free in each other's slot
+- extra lessons of an over-quota subject are cleared
+- missing lessons of an under-quota subject are placed in an empty period
+  where the teacher is free, making room with one move if needed
+
+A (teacher, day, period) -> class_groups index keeps every check O(1).
+Class_groups with grid or missing-timetable violations are left untouched
+for regeneration, though their lessons still count as busy teacher time,
+off-grid ones in every period they overlap.
+"""
+
+import copy
+
+from availability import SlotIndex
+from validation import find_violations
+
+
+def lesson_teacher(period):
+    """Return the teacher of a class period, or None for free periods and breaks"""
+    subject = period.get('subject')
+    if period.get('type') != 'class' or not subject:
+        return None
+    teacher = subject.get('teacher_name')
+    return teacher if teacher and teacher != "None" else None
+
+
+class TimetableRepair:
+    """Move/swap local search over the class_groups' period grids
+
+    Args:
+        class_timetables (dict): Class group -> {day: [period, ...]}; not modified
+        timetable_data (dict): Extracted TimetableData
+        locked (set): Class_groups that must not be edited
+    """
+
+    def __init__(self, class_timetables, timetable_data, locked=()):
+        self.timetable_data = timetable_data
+        self.index = SlotIndex.from_timetable_data(timetable_data)
+        self.order = {
+            class_group['name']: position for position, class_group in enumerate(timetable_data['class_groups'])
+        }
+        self.class_slots = [
+            (day, position) for day in self.index.days
+            for position, period in enumerate(timetable_data['periods']) if period['type'] == 'class'
+        ]
+        self.timetables = dict(class_timetables)
+        self.grids = {}
+        self.teacher_slots = {}  # (teacher, day, position) -> class_groups teaching then
+        self.changed = set()
+
+        for name, schedule in class_timetables.items():
+            editable = name not in locked
+            if editable:
+                schedule = self.timetables[name] = copy.deepcopy(schedule)
+                self.grids[name] = {}
+            for day, periods in schedule.items():
+                for period in periods:
+                    if day not in self.index.day_positions:
+                        continue
+                    position = self.index.period_position(period.get('start'), period.get('end'))
+                    teacher = lesson_teacher(period)
+                    if position is None:
+                        # An off-grid lesson can't be edited, but blocks its teacher in every period it overlaps
+                        for overlapped in self.index.busy_positions(period.get('start'), period.get('end')):
+                            if teacher:
+                                self.teacher_slots.setdefault((teacher, day, overlapped), []).append(name)
+                        continue
+                    if editable:
+                        self.grids[name][(day, position)] = period
+                    if teacher:
+                        self.teacher_slots.setdefault((teacher, day, position), []).append(name)
+
+        # Give editable class_groups a free period entry for every class slot they leave out
+        for name, grid in self.grids.items():
+            for day, position in self.class_slots:
+                if (day, position) not in grid:
+                    start, end = self.index.periods[position]
+                    period = {'period_no': position + 1, 'start': start, 'end': end, 'type': 'class', 'subject': None}
+                    grid[(day, position)] = period
+                    self.timetables[name].setdefault(day, []).append(period)
+
+    def is_free(self, teacher, slot) -> bool:
+        return not self.teacher_slots.get((teacher, *slot))
+
+    def _set_subject(self, class_group, slot, subject):
+        """Replace the subject taught in a slot, keeping the teacher index up to date"""
+        period = self.grids[class_group][slot]
+        old_teacher = lesson_teacher(period)
+        if old_teacher:
+            self.teacher_slots[(old_teacher, *slot)].remove(class_group)
+        period['type'] = 'class'
+        period['subject'] = subject
+        new_teacher = lesson_teacher(period)
+        if new_teacher:
+            self.teacher_slots.setdefault((new_teacher, *slot), []).append(class_group)
+        self.changed.add(class_group)
+
+    def _swap(self, class_group, slot, other):
+        grid = self.grids[class_group]
+        subject, other_subject = grid[slot]['subject'], grid[other]['subject']
+        self._set_subject(class_group, slot, None)
+        self._set_subject(class_group, other, None)
+        self._set_subject(class_group, slot, other_subject)
+        self._set_subject(class_group, other, subject)
+
+    def relocate(self, class_group, slot) -> bool:
+        """Move or swap the lesson in `slot` to a period where its teacher is free"""
+        grid = self.grids[class_group]
+        teacher = lesson_teacher(grid[slot])
+        for other in self.class_slots:
+            if other == slot or not self.is_free(teacher, other):
+                continue
+            other_teacher = lesson_teacher(grid[other])
+            if other_teacher is None or self.is_free(other_teacher, slot):
+                self._swap(class_group, slot, other)
+                return True
+        return False
+
+    def place(self, class_group, subject) -> bool:
+        """Put one more lesson of `subject` into a free period, moving one lesson to make room if needed"""
+        grid = self.grids[class_group]
+        teacher = subject.get('teacher_name')
+        empty = [slot for slot in self.class_slots if grid[slot]['subject'] is None]
+        for slot in empty:
+            if not teacher or self.is_free(teacher, slot):
+                self._set_subject(class_group, slot, subject)
+                return True
+        # Move a lesson into an empty period so the teacher's free slot opens up
+        for slot in empty:
+            for other in self.class_slots:
+                other_teacher = lesson_teacher(grid[other])
+                if other_teacher and self.is_free(teacher, other) and self.is_free(other_teacher, slot):
+                    self._swap(class_group, slot, other)
+                    self._set_subject(class_group, other, subject)
+                    return True
+        return False
+
+    def resolve_clashes(self):
+        for (teacher, day, position), class_groups in list(self.teacher_slots.items()):
+            # Later class_groups give way first, the earliest keeps the slot
+            for class_group in sorted(class_groups, key=self._order, reverse=True):
+                if len(self.teacher_slots[(teacher, day, position)]) <= 1:
+                    break
+                if class_group in self.grids:
+                    self.relocate(class_group, (day, position))
+
+    def resolve_quotas(self):
+        for class_group in self.timetable_data['class_groups']:
+            name = class_group['name']
+            if name not in self.grids:
+                continue
+            grid = self.grids[name]
+            for subject in class_group.get('subjects') or []:
+                expected = subject.get('slots_per_week')
+                if expected is None:
+                    continue
+                slots = [slot for slot in self.class_slots
+                         if (grid[slot].get('subject') or {}).get('name') == subject['name']]
+                for slot in slots[expected:]:
+                    self._set_subject(name, slot, None)
+                for _ in range(expected - len(slots)):
+                    if not self.place(name, {'name': subject['name'], 'teacher_name': subject.get('teacher')}):
+                        break
+
+    def _order(self, class_group):
+        return self.order.get(class_group, len(self.order))
+
+    def result(self) -> dict:
+        """Return the timetables with every changed day sorted back into period order"""
+        for name in self.changed:
+            for day, periods in self.timetables[name].items():
+                periods.sort(key=lambda period: self.index.period_position(period['start'], period['end']) or 0)
+        return {name: self.timetables[name] for name in self.timetables}
+
+
+def repair_timetables(class_timetables: dict, timetable_data: dict, violations=None):
+    """Fix clashes and quota violations locally
+
+    Args:
+        class_timetables (dict): Class group -> {day: [period, ...]}
+        timetable_data (dict): Extracted TimetableData
+        violations (list): Violations already found by find_violations, if any
+
+    Returns:
+        tuple: (timetables, changed class_groups, remaining violations)
+    """
+    if violations is None:
+        violations = find_violations(class_timetables, timetable_data)
+    locked = {record['class_group'] for record in violations if record['kind'] in ('grid', 'missing')}
+    repair = TimetableRepair(class_timetables, timetable_data, locked)
+    repair.resolve_clashes()
+    repair.resolve_quotas()
+    if not repair.changed:
+        return class_timetables, set(), violations
+
+    repaired = repair.result()
+    timetables = {name: repaired[name] if name in repair.changed else schedule
+                  for name, schedule in class_timetables.items()}
+    return timetables, repair.changed, find_violations(timetables, timetable_data)
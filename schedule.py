@@ -0,0 +1,294 @@
+"""
+Array-backed class schedules.
+
+Class timetables travel through the graph in the JSON shape the LLM returns:
+{class_group: {day: [period, ...]}}, with every day name, time, subject and
+teacher repeated as strings. Schedule packs a whole school into one flat
+array of cell IDs, laid out class_group x day x slot over the SlotIndex grid.
+Each distinct (type, subject, teacher) cell is interned once, and so is each
+teacher. Downstream stages (rebuilding teacher availability, building the
+class and teacher DataFrames) then read the arrays instead of walking dicts.
+
+Periods outside the extracted period grid get extra slots (and days) after
+the grid's own, so converting to and from the JSON shape keeps them; their
+teachers count as busy in every grid slot the lesson overlaps. A slot filled
+twice keeps its last period, as the DataFrame pivot always did.
+"""
+
+from array import array
+
+from availability import SlotIndex
+from utils import parse_clock_time
+
+EMPTY = 0  # Cell ID of a slot the class_group has no period for
+
+
+class Schedule:
+    """Every class_group's timetable as one class_group x day x slot array of interned cells
+
+    Args:
+        timetable_data (dict): Extracted TimetableData the slot grid comes from
+    """
+
+    __slots__ = ('index', 'days', 'day_positions', 'periods', 'period_positions', 'class_groups',
+                 'class_positions', 'cells', 'cell_ids', 'cell_teachers', 'teachers', 'teacher_ids', 'slots')
+
+    def __init__(self, timetable_data: dict):
+        self.index = SlotIndex.from_timetable_data(timetable_data)
+        self.days = list(self.index.days)
+        self.day_positions = dict(self.index.day_positions)
+        self.periods = list(self.index.periods)
+        self.period_positions = {}  # Off-grid (start, end) -> slot
+        self.class_groups = []
+        self.class_positions = {}
+        self.cells = [None]  # Cell ID -> (type, subject, teacher, times); times is None on the grid's own times
+        self.cell_ids = {}
+        self.cell_teachers = array('i', [-1])  # Cell ID -> teacher ID of a class lesson, -1 for none
+        self.teachers = []
+        self.teacher_ids = {}
+        self.slots = array('I')
+
+    @classmethod
+    def from_class_timetables(cls, class_timetables: dict, timetable_data: dict) -> "Schedule":
+        """Pack {class_group: {day: [period, ...]}} timetables in one pass"""
+        schedule = cls(timetable_data)
+        for class_group, days_data in class_timetables.items():
+            schedule.add(class_group, days_data)
+        return schedule
+
+    def _offset(self, class_position: int, day_position: int, slot: int) -> int:
+        return (class_position * len(self.days) + day_position) * len(self.periods) + slot
+
+    def _resize(self, days: list, periods: list):
+        """Re-lay the array for a larger day or slot axis; only off-grid periods trigger this"""
+        slots = array('I', bytes(4 * len(self.class_groups) * len(days) * len(periods)))
+        for class_position in range(len(self.class_groups)):
+            for day_position in range(len(self.days)):
+                start = self._offset(class_position, day_position, 0)
+                target = (class_position * len(days) + day_position) * len(periods)
+                slots[target:target + len(self.periods)] = self.slots[start:start + len(self.periods)]
+        self.days, self.periods, self.slots = days, periods, slots
+
+    def _slot(self, day: str, start: str, end: str) -> tuple:
+        """Return (day_position, slot, times), adding an off-grid day or slot when needed"""
+        day_position = self.day_positions.get(day)
+        position = self.index.period_position(start, end)
+        if day_position is None or position is None:
+            if position is None:
+                position = self.period_positions.get((start, end))
+            days, periods = self.days, self.periods
+            if day_position is None:
+                day_position = self.day_positions[day] = len(days)
+                days = days + [day]
+            if position is None:
+                position = self.period_positions[(start, end)] = len(periods)
+                periods = periods + [(start, end)]
+            if days is not self.days or periods is not self.periods:
+                self._resize(days, periods)
+        times = None if self.periods[position] == (start, end) else (start, end)
+        return day_position, position, times
+
+    def _cell(self, period: dict, times) -> int:
+        """Intern a period's (type, subject, teacher, times) and return its cell ID"""
+        subject = period.get('subject')
+        key = (period.get('type'), subject.get('name') if subject else None,
+               subject.get('teacher_name') if subject else None, times)
+        cell = self.cell_ids.get(key)
+        if cell is None:
+            cell = self.cell_ids[key] = len(self.cells)
+            self.cells.append(key)
+            teacher = key[2] if key[0] == 'class' and key[1] is not None else None
+            if teacher:
+                if teacher not in self.teacher_ids:
+                    self.teacher_ids[teacher] = len(self.teachers)
+                    self.teachers.append(teacher)
+                self.cell_teachers.append(self.teacher_ids[teacher])
+            else:
+                self.cell_teachers.append(-1)
+        return cell
+
+    def add(self, class_group: str, days_data: dict):
+        """Add or replace one class_group's timetable, given in the JSON shape"""
+        class_position = self.class_positions.get(class_group)
+        if class_position is None:
+            class_position = self.class_positions[class_group] = len(self.class_groups)
+            self.class_groups.append(class_group)
+            self.slots.frombytes(bytes(4 * len(self.days) * len(self.periods)))
+        else:
+            start = self._offset(class_position, 0, 0)
+            self.slots[start:start + len(self.days) * len(self.periods)] = array(
+                'I', bytes(4 * len(self.days) * len(self.periods))
+            )
+        for day, periods in days_data.items():
+            for period in periods:
+                day_position, position, times = self._slot(day, period.get('start'), period.get('end'))
+                self.slots[self._offset(class_position, day_position, position)] = self._cell(period, times)
+
+    def class_timetable(self, class_group: str) -> dict:
+        """Unpack one class_group back into {day: [period, ...]}"""
+        class_position = self.class_positions[class_group]
+        timetable = {}
+        for day_position, day in enumerate(self.days):
+            start = self._offset(class_position, day_position, 0)
+            periods = []
+            for position, cell in enumerate(self.slots[start:start + len(self.periods)]):
+                if cell == EMPTY:
+                    continue
+                type_, subject, teacher, times = self.cells[cell]
+                period_start, period_end = times or self.periods[position]
+                periods.append({
+                    'period_no': position + 1,
+                    'start': period_start,
+                    'end': period_end,
+                    'type': type_,
+                    'subject': None if subject is None else {'name': subject, 'teacher_name': teacher}
+                })
+            if periods:
+                timetable[day] = periods
+        return timetable
+
+    def to_class_timetables(self) -> dict:
+        """Unpack every class_group back into the JSON shape"""
+        return {class_group: self.class_timetable(class_group) for class_group in self.class_groups}
+
+    def teacher_busy_masks(self) -> dict[str, list[int]]:
+        """Per-day busy bitmasks of every teacher over the grid's own days and slots
+
+        A lesson whose times are not its slot's (or an off-grid slot) marks every
+        grid slot its minutes overlap, so misaligned lessons still block the teacher.
+        """
+        n_days, n_periods = len(self.index.days), len(self.index.periods)
+        slot_positions = [(position,) for position in range(n_periods)] + [
+            tuple(self.index.busy_positions(*times)) for times in self.periods[n_periods:]
+        ]
+        cell_positions = {}  # Cell ID -> grid slots of a cell carrying its own times
+        masks = {}
+        cell_teachers = self.cell_teachers
+        for offset, cell in enumerate(self.slots):
+            teacher = cell_teachers[cell]
+            if teacher < 0:
+                continue
+            rest, position = divmod(offset, len(self.periods))
+            day_position = rest % len(self.days)
+            if day_position >= n_days:
+                continue
+            times = self.cells[cell][3]
+            if times is not None:
+                positions = cell_positions.get(cell)
+                if positions is None:
+                    positions = cell_positions[cell] = tuple(self.index.busy_positions(*times))
+            else:
+                positions = slot_positions[position]
+            teacher_masks = masks.setdefault(self.teachers[teacher], [0] * n_days)
+            for busy_position in positions:
+                teacher_masks[day_position] |= 1 << busy_position
+        return masks
+
+    def teacher_timetables(self) -> dict:
+        """Invert the class_groups into {teacher: {day: [lesson, ...]}} in one pass over the array
+
+        Each lesson carries the class_group taught, and a teacher's day is in
+        time order. A clash shows up as two lessons at the same time.
+        """
+        slot_order = sorted(range(len(self.periods)), key=lambda position: parse_clock_time(self.periods[position][0]))
+        timetables = {}
+        n_days, n_periods = len(self.days), len(self.periods)
+        for day_position, day in enumerate(self.days):
+            for position in slot_order:
+                for class_position, class_group in enumerate(self.class_groups):
+                    cell = self.slots[(class_position * n_days + day_position) * n_periods + position]
+                    teacher = self.cell_teachers[cell]
+                    if teacher < 0:
+                        continue
+                    type_, subject, teacher_name, times = self.cells[cell]
+                    start, end = times or self.periods[position]
+                    timetables.setdefault(teacher_name, {}).setdefault(day, []).append({
+                        'period_no': position + 1,
+                        'start': start,
+                        'end': end,
+                        'type': type_,
+                        'subject': subject,
+                        'class_group': class_group
+                    })
+        return {teacher: timetables[teacher] for teacher in self.teachers if teacher in timetables}
+
+    def grid(self):
+        """The cell IDs as a numpy array of shape (class_groups, days, slots), sharing this schedule's memory"""
+        import numpy as np
+
+        return np.frombuffer(self.slots, dtype=np.uint32).reshape(
+            len(self.class_groups), len(self.days), len(self.periods)
+        )
+
+    def _columns(self, used) -> list[int]:
+        """Used slots in chronological order"""
+        return sorted(
+            (position for position, is_used in enumerate(used) if is_used),
+            key=lambda position: parse_clock_time(self.periods[position][0])
+        )
+
+    def _time_slot(self, position: int) -> str:
+        start, end = self.periods[position]
+        return f"{start} - {end}"
+
+    def class_frames(self) -> dict:
+        """One days x time-slots DataFrame per class_group, showing the subject or the period type"""
+        import numpy as np
+        import pandas as pd
+
+        grid = self.grid()
+        labels = np.array(
+            [""] + [subject if subject is not None else (type_ or "").capitalize()
+                    for type_, subject, _, _ in self.cells[1:]],
+            dtype=object
+        )
+        columns = self._columns((grid != EMPTY).any(axis=(0, 1)))
+        index, time_slots = pd.Index(self.days), pd.Index([self._time_slot(position) for position in columns])
+        cells = labels[grid[:, :, columns]]
+        return {
+            class_group: pd.DataFrame(cells[class_position], index=index, columns=time_slots, dtype=object)
+            for class_position, class_group in enumerate(self.class_groups)
+        }
+
+    def teacher_frames(self, time_slots=None) -> dict:
+        """Invert the class_groups into one days x time-slots DataFrame per teacher"""
+        import numpy as np
+        import pandas as pd
+
+        grid = self.grid()
+        teacher_grid = np.asarray(self.cell_teachers)[grid]
+        lessons = np.argwhere(teacher_grid >= 0)  # (class_position, day_position, slot) rows in class order
+        class_positions, day_positions, positions = lessons.T
+        if time_slots is None:
+            used = np.zeros(len(self.periods), dtype=bool)
+            used[positions] = True
+            columns = self._columns(used)
+        else:
+            # Slots the frames should show; a time slot no lesson uses points at a trailing blank column
+            slot_positions = {self._time_slot(position): position for position in range(len(self.periods))}
+            columns = [slot_positions.get(time_slot, len(self.periods)) for time_slot in time_slots]
+        labels = [
+            f"{self.cells[cell][1]} ({self.class_groups[class_position]})"
+            for cell, class_position in zip(grid[class_positions, day_positions, positions].tolist(),
+                                            class_positions.tolist())
+        ]
+        teachers = teacher_grid[class_positions, day_positions, positions]
+
+        # Group lessons by teacher in first-seen order; within a teacher a later class_group overwrites
+        # an earlier one in a clashing slot, as the pivot's keep="last" did
+        order = np.argsort(teachers, kind="stable")
+        bounds = np.flatnonzero(np.diff(teachers[order])) + 1
+        groups = sorted(np.split(order, bounds), key=lambda group: group[0]) if len(order) else []
+        labels = np.array(labels, dtype=object)
+        time_slots = [self._time_slot(position) for position in columns] if time_slots is None else list(time_slots)
+
+        # Every frame shares one row and one column index
+        index, time_slots = pd.Index(self.days), pd.Index(time_slots)
+        frames = {}
+        for group in groups:
+            table = np.full((len(self.days), len(self.periods) + 1), "", dtype=object)
+            table[day_positions[group], positions[group]] = labels[group]
+            frames[self.teachers[teachers[group[0]]]] = pd.DataFrame(
+                table[:, columns], index=index, columns=time_slots, dtype=object
+            )
+        return frames
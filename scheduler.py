@@ -0,0 +1,220 @@
+"""
+Rate-limited, retrying LLM calls.
+
+Every chat model built by main.py is wrapped in a ScheduledChatModel. Calls
+first take a token from their provider's token bucket, so concurrent nodes
+and jobs stay under the provider's request rate together, and transient
+failures (429, 5xx, timeouts, dropped connections) are retried with
+jittered exponential backoff instead of failing the graph. Limits come from
+the same env var prefix as the model itself, e.g. LLM_REQUESTS_PER_MINUTE
+or STRUCTURED_LLM_MAX_RETRIES.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+
+from tracing import record_retry
+
+RETRYABLE_STATUS_CODES = {408, 409, 425, 429, 500, 502, 503, 504, 529}
+RETRYABLE_ERROR_NAMES = ("RateLimit", "Timeout", "ServiceUnavailable", "ResourceExhausted", "Overloaded",
+                         "APIConnection", "InternalServer")
+
+
+class TokenBucket:
+    """Thread-safe token bucket; a rate of zero means unlimited"""
+
+    def __init__(self, requests_per_minute: float, burst: int = 1):
+        self.rate = requests_per_minute / 60
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        """Take a token and return how many seconds to wait before using it"""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            self.tokens -= 1
+            return max(0.0, -self.tokens / self.rate)
+
+    def acquire(self):
+        time.sleep(self.reserve())
+
+    async def aacquire(self):
+        await asyncio.sleep(self.reserve())
+
+
+def status_code(error):
+    """Return the HTTP status code carried by a provider exception, if any"""
+    for source in (error, getattr(error, "response", None)):
+        code = getattr(source, "status_code", None) or getattr(source, "code", None)
+        if isinstance(code, int):
+            return code
+    return None
+
+
+def is_retryable(error) -> bool:
+    """Whether an exception looks like a transient provider or network failure"""
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+    code = status_code(error)
+    if code is not None:
+        return code in RETRYABLE_STATUS_CODES
+    return any(name in type(error).__name__ for name in RETRYABLE_ERROR_NAMES)
+
+
+def retry_after(error):
+    """Seconds the provider asked us to wait (Retry-After header), if it said"""
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+
+class CallScheduler:
+    """Rate limits and retries calls to one provider
+
+    Args:
+        bucket (TokenBucket): Request budget shared by every model of the provider
+        max_retries (int): Retries of a transient failure before it is raised
+        backoff_base (float): First backoff ceiling in seconds, doubled on every retry
+        backoff_max (float): Largest backoff ceiling in seconds
+    """
+
+    def __init__(self, bucket, max_retries=5, backoff_base=1.0, backoff_max=60.0):
+        self.bucket = bucket
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+    def backoff(self, attempt: int, error) -> float:
+        """Full-jitter exponential backoff, never shorter than the provider's Retry-After"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        return max(delay, retry_after(error) or 0.0)
+
+    def _should_retry(self, attempt: int, error) -> bool:
+        if attempt >= self.max_retries or not is_retryable(error):
+            return False
+        record_retry()
+        return True
+
+    def call(self, function):
+        """Run function() under the rate limit, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            try:
+                return function()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                time.sleep(self.backoff(attempt, e))
+
+    async def acall(self, function):
+        """Await function() under the rate limit, retrying transient failures"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.aacquire()
+            try:
+                return await function()
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                await asyncio.sleep(self.backoff(attempt, e))
+
+    def stream(self, open_stream):
+        """Yield from open_stream() under the rate limit, retrying failures before the first chunk"""
+        for attempt in range(self.max_retries + 1):
+            self.bucket.acquire()
+            chunks = open_stream()
+            try:
+                first = next(chunks)
+            except StopIteration:
+                return
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                time.sleep(self.backoff(attempt, e))
+                continue
+            yield first
+            yield from chunks
+            return
+
+    async def astream(self, open_stream):
+        """Async counterpart of stream"""
+        for attempt in range(self.max_retries + 1):
+            await self.bucket.aacquire()
+            chunks = open_stream()
+            try:
+                first = await anext(chunks)
+            except StopAsyncIteration:
+                return
+            except Exception as e:
+                if not self._should_retry(attempt, e):
+                    raise
+                await asyncio.sleep(self.backoff(attempt, e))
+                continue
+            try:
+                yield first
+                async for chunk in chunks:
+                    yield chunk
+            finally:
+                await chunks.aclose()
+            return
+
+
+_buckets = {}
+_buckets_lock = threading.Lock()
+
+
+def get_bucket(provider: str, requests_per_minute: float) -> TokenBucket:
+    """Return the provider's shared bucket; the strictest configured rate wins"""
+    with _buckets_lock:
+        bucket = _buckets.get(provider)
+        if bucket is None:
+            bucket = _buckets[provider] = TokenBucket(requests_per_minute)
+        elif requests_per_minute > 0 and (bucket.rate <= 0 or requests_per_minute / 60 < bucket.rate):
+            bucket.rate = requests_per_minute / 60
+        return bucket
+
+
+def scheduler_from_env(prefix: str, provider: str) -> CallScheduler:
+    """Build a scheduler from <prefix>_REQUESTS_PER_MINUTE, _MAX_RETRIES, _BACKOFF_BASE_SECONDS and _BACKOFF_MAX_SECONDS"""
+    return CallScheduler(
+        get_bucket(provider, float(os.getenv(f"{prefix}_REQUESTS_PER_MINUTE", "0"))),
+        max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", "5")),
+        backoff_base=float(os.getenv(f"{prefix}_BACKOFF_BASE_SECONDS", "1")),
+        backoff_max=float(os.getenv(f"{prefix}_BACKOFF_MAX_SECONDS", "60"))
+    )
+
+
+class ScheduledChatModel:
+    """Wrap a chat model so every call goes through a CallScheduler"""
+
+    def __init__(self, model, scheduler: CallScheduler):
+        self.model = model
+        self.scheduler = scheduler
+
+    def with_structured_output(self, schema, **kwargs):
+        return ScheduledChatModel(self.model.with_structured_output(schema, **kwargs), self.scheduler)
+
+    def invoke(self, messages, *args, **kwargs):
+        return self.scheduler.call(lambda: self.model.invoke(messages, *args, **kwargs))
+
+    async def ainvoke(self, messages, *args, **kwargs):
+        return await self.scheduler.acall(lambda: self.model.ainvoke(messages, *args, **kwargs))
+
+    def stream(self, messages, *args, **kwargs):
+        return self.scheduler.stream(lambda: iter(self.model.stream(messages, *args, **kwargs)))
+
+    def astream(self, messages, *args, **kwargs):
+        return self.scheduler.astream(lambda: aiter(self.model.astream(messages, *args, **kwargs)))
+
+    def __getattr__(self, name):
+        return getattr(self.model, name)
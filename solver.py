@@ -0,0 +1,167 @@
+"""
+Deterministic constraint solver for class group timetables.
+
+Places every subject's weekly lessons into the free class periods of one
+class group using backtracking search with forward checking, so the LLM is
+only needed for extracting the school data. Produces the same
+``{class: {day: [period, ...]}}`` shape as the LLM generator.
+"""
+
+
+def build_lessons(class_group_data, capacity):
+    """Expand subjects into (subject, teacher, count) demands that fit the capacity
+
+    Returns:
+        tuple: (lessons, trimmed) where trimmed maps subject names to the lessons
+        dropped because the class asks for more periods than exist
+    """
+    demands = []
+    for subject in class_group_data.get('subjects') or []:
+        if not subject.get('name'):
+            continue
+        count = subject.get('slots_per_week') or 0
+        if count > 0:
+            demands.append([subject['name'], subject.get('teacher'), count])
+
+    # Trim the largest demands first when the class asks for more periods than exist
+    trimmed = {}
+    overflow = sum(count for _, _, count in demands) - capacity
+    while overflow > 0:
+        largest = max(demands, key=lambda demand: demand[2])
+        largest[2] -= 1
+        trimmed[largest[0]] = trimmed.get(largest[0], 0) + 1
+        overflow -= 1
+
+    return [tuple(demand) for demand in demands if demand[2] > 0], trimmed
+
+
+def solve_class_group(class_group_data, days, periods, availability, max_steps=20000):
+    """
+    Build a timetable for a single class group.
+
+    Args:
+        class_group_data (dict): Class group with its subjects (ClassGroup dump)
+        days (list): School days in order
+        periods (list): Day template of periods (TimePeriod dumps)
+        availability (TeacherAvailability): Teacher busy periods from other class groups
+        max_steps (int): Search budget before falling back to the best partial schedule
+
+    Returns:
+        tuple: (schedule, unplaced) where schedule is {day: [period, ...]} and
+        unplaced maps subject names to the number of lessons that could not be placed,
+        including those that did not fit in the week's class periods or their teacher's free periods
+    """
+    class_periods = [index for index, period in enumerate(periods) if period.get('type') == 'class']
+    slots = [(day, index) for day in days for index in class_periods]
+    lessons, trimmed = build_lessons(class_group_data, len(slots))
+
+    # Domain of each subject: slots where its teacher is not already busy
+    domains = []
+    for _, teacher, _ in lessons:
+        domains.append({
+            slot_no for slot_no, (day, index) in enumerate(slots)
+            if not teacher or availability.is_free(teacher, day, index)
+        })
+
+    # A teacher free for fewer periods than their subject needs would fail the forward check
+    # at the root, so cap each subject at its domain and report the excess as unplaced
+    for lesson, (name, teacher, count) in enumerate(lessons):
+        if count > len(domains[lesson]):
+            trimmed[name] = trimmed.get(name, 0) + count - len(domains[lesson])
+            lessons[lesson] = (name, teacher, len(domains[lesson]))
+
+    remaining = [count for _, _, count in lessons]
+    assigned = {}  # slot_no -> lesson index
+    per_day = [dict.fromkeys(days, 0) for _ in lessons]
+    best = {'assigned': {}}
+    steps = 0
+
+    def slack(lesson):
+        return len(domains[lesson]) - remaining[lesson]
+
+    def search():
+        nonlocal steps
+        if len(assigned) > len(best['assigned']):
+            best['assigned'] = dict(assigned)
+
+        open_lessons = [lesson for lesson, count in enumerate(remaining) if count > 0]
+        if not open_lessons:
+            return True
+        steps += 1
+        if steps > max_steps:
+            return False
+
+        # Most constrained subject first, spreading its lessons over the week
+        lesson = min(open_lessons, key=slack)
+        candidates = sorted(
+            domains[lesson],
+            key=lambda slot_no: (per_day[lesson][slots[slot_no][0]], slot_no)
+        )
+        for slot_no in candidates:
+            day = slots[slot_no][0]
+            assigned[slot_no] = lesson
+            remaining[lesson] -= 1
+            per_day[lesson][day] += 1
+
+            # Forward check: drop the slot from every other domain
+            pruned = [other for other, domain in enumerate(domains) if slot_no in domain]
+            for other in pruned:
+                domains[other].discard(slot_no)
+
+            if all(remaining[other] <= len(domains[other]) for other in open_lessons) and search():
+                return True
+
+            for other in pruned:
+                domains[other].add(slot_no)
+            per_day[lesson][day] -= 1
+            remaining[lesson] += 1
+            del assigned[slot_no]
+
+            if steps > max_steps:
+                return False
+        return False
+
+    placed = [0] * len(lessons)
+    if search():
+        placement = assigned
+        for lesson in placement.values():
+            placed[lesson] += 1
+    else:
+        placement = best['assigned']
+        for lesson in placement.values():
+            placed[lesson] += 1
+        # The search only keeps branches that place every lesson, so fill the slots the
+        # best partial schedule left empty with any unfinished subject whose teacher is free
+        for lesson in sorted(range(len(lessons)), key=lambda lesson: len(domains[lesson])):
+            for slot_no in sorted(domains[lesson] - placement.keys()):
+                if placed[lesson] >= lessons[lesson][2]:
+                    break
+                placement[slot_no] = lesson
+                placed[lesson] += 1
+
+    # Lessons trimmed for lack of periods count as unplaced too
+    unplaced = dict(trimmed)
+    for lesson, (name, _, count) in enumerate(lessons):
+        if count > placed[lesson]:
+            unplaced[name] = unplaced.get(name, 0) + count - placed[lesson]
+
+    slot_lookup = {slots[slot_no]: lesson for slot_no, lesson in placement.items()}
+    schedule = {}
+    for day in days:
+        day_periods = []
+        for index, period in enumerate(periods):
+            entry = {
+                "period_no": index + 1,
+                "start": period['start'],
+                "end": period['end'],
+                "type": period.get('type') or "other",
+                "subject": None
+            }
+            lesson = slot_lookup.get((day, index))
+            if lesson is not None:
+                name, teacher, _ = lessons[lesson]
+                entry["subject"] = {"name": name, "teacher_name": teacher}
+            day_periods.append(entry)
+        schedule[day] = day_periods
+
+    return schedule, unplaced
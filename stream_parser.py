@@ -0,0 +1,169 @@
+"""
+Incremental parsing of streamed class_group schedules.
+
+The generation prompt asks for {"Class": {"Monday": [{period}, ...], ...}}.
+ScheduleStreamParser is fed the completion token by token and tracks only
+the bracket depth and string state, so every period object is decoded and
+checked against the school's period grid the moment its closing brace
+arrives, and every day is reported through on_day as soon as its array
+closes. A structural error raises ScheduleStreamError mid-stream, so the
+caller can drop the rest of the completion and ask again. A parser built
+with strict=False instead reads the rest of the completion and returns it
+as plain JSON, leaving off-grid periods to timetable validation.
+"""
+
+import json
+
+from availability import SlotIndex
+from utils import remove_markdown_code_blocks
+
+# Bracket depths of the expected document: {class: {day: [{period: {subject}}]}}
+CLASS_DEPTH, DAYS_DEPTH, PERIODS_DEPTH, PERIOD_DEPTH = 1, 2, 3, 4
+
+
+class ScheduleStreamError(ValueError):
+    """The streamed schedule does not have the expected structure"""
+
+
+class ScheduleStreamParser:
+    """Parse one class_group's schedule from streamed JSON text
+
+    Args:
+        class_group (str): Class group the schedule must be keyed by
+        days (list): School days
+        periods (list): The school's period grid (TimetableData.periods)
+        on_day (callable): Called with (day, periods) as soon as a day is complete
+        strict (bool): Raise on the first error; otherwise remember it and parse the whole completion in result()
+    """
+
+    def __init__(self, class_group, days, periods, on_day=None, strict=True):
+        self.class_group = class_group
+        self.index = SlotIndex(days, periods)
+        self.on_day = on_day
+        self.strict = strict
+        self.error = None
+        self.schedule = None
+        self.buffer = ""
+        self.position = 0
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+        self.string_start = None
+        self.last_key = None
+        self.day = None
+        self.day_periods = []
+        self.last_position = -1
+        self.period_start = None
+        self.done = False
+
+    def feed(self, text: str):
+        """Consume the next chunk of the completion, validating every object it completes"""
+        if self.done:
+            return
+        self.buffer += text
+        if self.error is not None:
+            return
+        try:
+            self._scan()
+        except ScheduleStreamError as e:
+            if self.strict:
+                raise
+            self.error = e
+
+    def _scan(self):
+        buffer = self.buffer
+        for position in range(self.position, len(buffer)):
+            char = buffer[position]
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif char == "\\":
+                    self.escaped = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth in (CLASS_DEPTH, DAYS_DEPTH):
+                        self.last_key = json.loads(buffer[self.string_start:position + 1])
+                continue
+
+            if self.depth == 0:
+                # Skip anything before the document, such as a ```json fence
+                if char == "{":
+                    self.depth = 1
+                    self.schedule = {}
+                continue
+
+            if char == '"':
+                self.in_string = True
+                self.string_start = position
+            elif char in "{[":
+                self.depth += 1
+                self._open(char, position)
+            elif char in "}]":
+                self._close(char, position)
+                self.depth -= 1
+                if self.depth == 0:
+                    self.done = True
+                    break
+        self.position = len(buffer)
+
+    def _open(self, char, position):
+        if self.depth == DAYS_DEPTH:
+            if char != "{" or self.last_key != self.class_group:
+                raise ScheduleStreamError(f"Expected a schedule for {self.class_group!r}, got {self.last_key!r}")
+        elif self.depth == PERIODS_DEPTH:
+            if char != "[" or self.last_key not in self.index.day_positions:
+                raise ScheduleStreamError(f"Expected a list of periods for a school day, got {self.last_key!r}")
+            if self.last_key in self.schedule:
+                raise ScheduleStreamError(f"{self.last_key} appears twice")
+            self.day = self.last_key
+            self.day_periods = []
+            self.last_position = -1
+        elif self.depth == PERIOD_DEPTH:
+            if char != "{":
+                raise ScheduleStreamError(f"Expected a period object in {self.day}")
+            self.period_start = position
+
+    def _close(self, char, position):
+        if self.depth == PERIOD_DEPTH:
+            try:
+                period = json.loads(self.buffer[self.period_start:position + 1])
+            except ValueError as e:
+                raise ScheduleStreamError(f"Malformed period in {self.day}: {e}") from e
+            self._add_period(period)
+        elif self.depth == PERIODS_DEPTH:
+            self.schedule[self.day] = self.day_periods
+            if self.on_day:
+                self.on_day(self.day, self.day_periods)
+
+    def _add_period(self, period: dict):
+        """Check a period against the grid: known slot, in order, and a subject for class periods"""
+        if not isinstance(period.get('start'), str) or not isinstance(period.get('end'), str):
+            raise ScheduleStreamError(f"Period without start/end time in {self.day}: {period}")
+        position = self.index.period_position(period['start'], period['end'])
+        if position is None:
+            raise ScheduleStreamError(f"{self.day} {period['start']}-{period['end']} is not in the period grid")
+        if position <= self.last_position:
+            raise ScheduleStreamError(f"{self.day} {period['start']}-{period['end']} is out of order")
+        subject = period.get('subject')
+        if period.get('type') == 'class' and subject is not None and (
+                not isinstance(subject, dict) or not subject.get('name')):
+            raise ScheduleStreamError(f"Malformed subject in {self.day} {period['start']}: {subject}")
+        self.last_position = position
+        self.day_periods.append(period)
+
+    def result(self) -> dict:
+        """Return the parsed {day: [period, ...]} schedule once the document is complete"""
+        if self.error is not None:
+            # Not strict: hand the completion over as it is, for timetable validation and repair to fix
+            return json.loads(remove_markdown_code_blocks(self.buffer))[self.class_group]
+        if not self.done:
+            raise ScheduleStreamError(f"Completion for {self.class_group} ended before the schedule was complete")
+        return self.schedule
+
+
+def chunk_text(chunk) -> str:
+    """Return the text of a streamed message chunk, whether its content is a string or content blocks"""
+    content = chunk.content
+    if isinstance(content, str):
+        return content
+    return "".join(part.get("text", "") if isinstance(part, dict) else str(part) for part in content)
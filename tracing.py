@@ -0,0 +1,190 @@
+"""
+Per-node tracing for the timetable workflow.
+
+Every node added by build_workflow is wrapped so its wall time is recorded as
+a span. While a node runs, its span is the current one, so the LLM wrapper
+and the file writers can attribute tokens, cache hits and bytes written to it
+without threading anything through the graph state. A finished run can be
+exported as JSON or OpenMetrics text and summarised per node.
+"""
+
+import contextvars
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+_current_span = contextvars.ContextVar("skejul_current_span", default=None)
+
+SPAN_COUNTERS = ('input_tokens', 'output_tokens', 'llm_calls', 'retries', 'cache_hits', 'cache_misses', 'bytes_written')
+
+
+class NodeSpan:
+    """Wall time and counters for one execution of a workflow node"""
+
+    __slots__ = ('node', 'started_at', 'seconds') + SPAN_COUNTERS
+
+    def __init__(self, node: str, started_at: float):
+        self.node = node
+        self.started_at = started_at
+        self.seconds = 0.0
+        for counter in SPAN_COUNTERS:
+            setattr(self, counter, 0)
+
+    def to_dict(self) -> dict:
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class RunTracer:
+    """Collects the spans of every traced node run in this process"""
+
+    def __init__(self):
+        self.spans = []
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Forget every span, e.g. before starting a new run"""
+        with self._lock:
+            self.spans = []
+            self.started_at = time.perf_counter()
+
+    def add(self, span: NodeSpan):
+        with self._lock:
+            self.spans.append(span)
+
+    def summary(self) -> dict:
+        """Aggregate spans per node, in order of first execution"""
+        nodes = {}
+        with self._lock:
+            spans = list(self.spans)
+        for span in spans:
+            totals = nodes.setdefault(span.node, {'runs': 0, 'seconds': 0.0, **dict.fromkeys(SPAN_COUNTERS, 0)})
+            totals['runs'] += 1
+            totals['seconds'] += span.seconds
+            for counter in SPAN_COUNTERS:
+                totals[counter] += getattr(span, counter)
+        return nodes
+
+    def to_json(self) -> str:
+        with self._lock:
+            spans = [span.to_dict() for span in self.spans]
+        return json.dumps({"nodes": self.summary(), "spans": spans}, indent=2)
+
+    def to_openmetrics(self) -> str:
+        """Render the per-node totals in the OpenMetrics text format"""
+        summary = self.summary()
+        metrics = [('node_runs', 'Node executions', 'runs'),
+                   ('node_duration_seconds', 'Node wall time in seconds', 'seconds')]
+        metrics += [(counter, f"{counter.replace('_', ' ').capitalize()} attributed to the node", counter)
+                    for counter in SPAN_COUNTERS]
+
+        lines = []
+        for name, help_text, key in metrics:
+            lines.append(f"# TYPE skejul_{name} counter")
+            lines.append(f"# HELP skejul_{name} {help_text}.")
+            for node, totals in summary.items():
+                lines.append(f'skejul_{name}_total{{node="{node}"}} {totals[key]}')
+        lines.append("# EOF")
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str):
+        """Write the trace to path, as OpenMetrics for .prom/.om files and JSON otherwise"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        openmetrics = os.path.splitext(path)[1] in (".prom", ".om")
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.to_openmetrics() if openmetrics else self.to_json())
+
+    def table_rows(self) -> list:
+        """Summary rows for print_table, one per node"""
+        return [
+            [node, totals['runs'], f"{totals['seconds']:.2f}", totals['llm_calls'], totals['retries'],
+             f"{totals['input_tokens']} / {totals['output_tokens']}",
+             f"{totals['cache_hits']} / {totals['cache_misses']}", f"{totals['bytes_written'] / 1024:.0f}"]
+            for node, totals in self.summary().items()
+        ]
+
+
+TABLE_HEADERS = ["Node", "Runs", "Time (s)", "LLM Calls", "Retries", "Tokens In / Out", "Cache Hits / Misses", "Written (KB)"]
+
+_tracer = RunTracer()
+
+
+def get_tracer() -> RunTracer:
+    """Return the process-wide tracer"""
+    return _tracer
+
+
+def traced_node(name: str, node):
+    """Wrap a workflow node so every call is recorded as a span named after the node"""
+    def start():
+        span = NodeSpan(name, time.perf_counter() - _tracer.started_at)
+        return span, _current_span.set(span), time.perf_counter()
+
+    def finish(span, token, started):
+        span.seconds = time.perf_counter() - started
+        _current_span.reset(token)
+        _tracer.add(span)
+
+    if inspect.iscoroutinefunction(node):
+        @functools.wraps(node)
+        async def async_wrapper(state):
+            span, token, started = start()
+            try:
+                return await node(state)
+            finally:
+                finish(span, token, started)
+        return async_wrapper
+
+    @functools.wraps(node)
+    def wrapper(state):
+        span, token, started = start()
+        try:
+            return node(state)
+        finally:
+            finish(span, token, started)
+    return wrapper
+
+
+def record_llm_response(response):
+    """Count an LLM call and the tokens it reports on the current node's span"""
+    span = _current_span.get()
+    if span is None:
+        return
+    span.llm_calls += 1
+    usage = getattr(response, "usage_metadata", None) or {}
+    span.input_tokens += usage.get("input_tokens", 0)
+    span.output_tokens += usage.get("output_tokens", 0)
+
+
+def record_retry():
+    """Count a retried LLM call or re-asked completion on the current node's span"""
+    span = _current_span.get()
+    if span is not None:
+        span.retries += 1
+
+
+def record_cache_lookup(hit: bool):
+    """Count an LLM cache hit or miss on the current node's span"""
+    span = _current_span.get()
+    if span is None:
+        return
+    if hit:
+        span.cache_hits += 1
+    else:
+        span.cache_misses += 1
+
+
+def record_file_written(path: str):
+    """Add the size of a freshly written file to the current node's span"""
+    span = _current_span.get()
+    if span is None:
+        return
+    try:
+        span.bytes_written += os.path.getsize(path)
+    except OSError:
+        pass
@@ -1,6 +1,8 @@
 import sys 
 import time
 import re
+from datetime import datetime
+from functools import lru_cache
 
 def generate_mermaid_diagram(graph):
     """Generate horizontal Mermaid diagram for the workflow"""
@@ -10,6 +12,22 @@ def remove_markdown_code_blocks(text: str) -> str:
     # Removes triple backtick fences (e.g., ```json ... ```)
     return re.sub(r"```(?:json|python)?\s*([\s\S]*?)\s*```", r"\1", text).strip()
 
+@lru_cache(maxsize=None)
+def parse_clock_time(text: str) -> int:
+    """Parse a clock time like "08:40 AM", "8:40AM" or "15:50" into minutes after midnight (memoised)"""
+    cleaned = text.strip().upper()
+    for time_format in ("%I:%M %p", "%I:%M%p", "%H:%M"):
+        try:
+            parsed = datetime.strptime(cleaned, time_format)
+            return parsed.hour * 60 + parsed.minute
+        except ValueError:
+            continue
+    raise ValueError(f"Unrecognised time: {text!r}")
+
+def safe_filename(name: str) -> str:
+    """Turn a class group or teacher name into a safe file name stem"""
+    return name.replace(" ", "_").replace("/", "_")
+
 def loading_animation(stop_event):
     """Display a loading animation until stop_event is set."""
     chars = ["⢿", "⣻", "⣽", "⣾", "⣷", "⣯", "⣟", "⡿"]
@@ -20,4 +38,37 @@ def loading_animation(stop_event):
         idx += 1
         time.sleep(0.1)
     sys.stdout.write('\rGenerating timetable structure... ✓\n')
-    sys.stdout.flush()
\ No newline at end of file
+    sys.stdout.flush()
+
+def partition_teacher_disjoint(class_groups):
+    """Group class_groups into waves where no two members share a teacher.
+
+    Greedy colouring of the teacher-conflict graph, most-connected class first,
+    so each wave can be generated concurrently without double-booking teachers.
+    """
+    teachers = {
+        class_group['name']: {
+            subject['teacher'] for subject in class_group.get('subjects') or []
+            if subject.get('teacher')
+        }
+        for class_group in class_groups
+    }
+    conflicts = {
+        name: sum(1 for other, other_teachers in teachers.items()
+                  if other != name and own & other_teachers)
+        for name, own in teachers.items()
+    }
+
+    waves = []  # list of (class names, teachers used by the wave)
+    for name in sorted(teachers, key=lambda name: -conflicts[name]):
+        for wave, wave_teachers in waves:
+            if not teachers[name] & wave_teachers:
+                wave.append(name)
+                wave_teachers |= teachers[name]
+                break
+        else:
+            waves.append(([name], set(teachers[name])))
+
+    # Keep the original class order inside each wave
+    order = {class_group['name']: index for index, class_group in enumerate(class_groups)}
+    return [sorted(wave, key=order.get) for wave, _ in waves]
@@ -0,0 +1,113 @@
+"""
+Validation of generated class timetables.
+
+find_violations walks every period of every class_group once, building
+per-class slot/subject counters and each teacher's lessons per day in
+integer minutes. Clashes are then found with one sweep over each teacher's
+day, so lessons that overlap without sharing a slot (a 35-minute lesson
+against 40-minute periods, or one off the grid) are caught too. It reports:
+
+- clash: a teacher booked in two class_groups at overlapping times
+- grid: a period that is not in TimetableData.periods, or a slot filled twice
+- quota: a subject scheduled more or fewer times than its slots_per_week
+- missing: a class_group with no timetable at all
+
+Every violation names the class_group that should be regenerated to fix it,
+so only offending class_groups are sent back to generation.
+"""
+
+from availability import SlotIndex, clock_minutes
+from intervals import find_overlaps
+
+
+def violation(kind: str, class_group: str, message: str, day=None, period=None) -> dict:
+    """Build a JSON-serialisable violation record"""
+    return {'kind': kind, 'class_group': class_group, 'day': day, 'period': period, 'message': message}
+
+
+def find_violations(class_timetables: dict, timetable_data: dict) -> list[dict]:
+    """Check every class_group timetable for clashes, grid mismatches and quota violations
+
+    Args:
+        class_timetables (dict): Class group -> {day: [period, ...]}
+        timetable_data (dict): Extracted TimetableData
+
+    Returns:
+        list: Violation records, in class_group order
+    """
+    index = SlotIndex.from_timetable_data(timetable_data)
+    order = {class_group['name']: position for position, class_group in enumerate(timetable_data['class_groups'])}
+    teacher_lessons = {}  # (teacher, day) -> [(start, end, (class order, lesson no, class_group, label)), ...]
+    violations = []
+
+    for class_group in timetable_data['class_groups']:
+        name = class_group['name']
+        schedule = class_timetables.get(name)
+        if schedule is None:
+            violations.append(violation('missing', name, f"No timetable generated for {name}"))
+            continue
+
+        used_slots = set()
+        subject_counts = {}
+        for day, periods in schedule.items():
+            for period in periods:
+                label = f"{period.get('start')}-{period.get('end')}"
+                position = index.period_position(period.get('start'), period.get('end'))
+                on_grid = day in index.day_positions and position is not None
+                if not on_grid:
+                    violations.append(violation('grid', name, f"{day} {label} is not in the period grid", day, label))
+                elif (day, position) in used_slots:
+                    violations.append(violation('grid', name, f"{day} {label} is filled twice", day, label))
+                    continue
+                else:
+                    used_slots.add((day, position))
+
+                subject = period.get('subject')
+                if period.get('type') != 'class' or not subject:
+                    continue
+                if on_grid:
+                    subject_counts[subject.get('name')] = subject_counts.get(subject.get('name'), 0) + 1
+
+                teacher = subject.get('teacher_name')
+                if not teacher or teacher == "None":
+                    continue
+                # The slot's minutes, or the lesson's own when it is written differently or off the grid
+                times = (period.get('start'), period.get('end'))
+                start, end = index.minutes[position] if on_grid else (None, None)
+                if not on_grid or index.periods[position] != times:
+                    start_minute, end_minute = clock_minutes(times[0]), clock_minutes(times[1])
+                    if start_minute is not None and end_minute is not None and end_minute > start_minute:
+                        start, end = start_minute, end_minute
+                if start is None or end is None:
+                    continue
+                lessons = teacher_lessons.setdefault((teacher, day), [])
+                lessons.append((start, end, (order.get(name, 0), len(lessons), name, label)))
+
+        for subject in class_group.get('subjects') or []:
+            expected = subject.get('slots_per_week')
+            scheduled = subject_counts.get(subject.get('name'), 0)
+            if expected is not None and scheduled != expected:
+                violations.append(violation(
+                    'quota', name, f"{subject.get('name')} scheduled {scheduled}x, expected {expected}x"
+                ))
+
+    for (teacher, day), lessons in teacher_lessons.items():
+        blamed = set()
+        for earlier, later in find_overlaps(lessons):
+            # Blame whichever class_group comes later, the earlier one keeps its slot
+            kept, moved = sorted((earlier[2], later[2]))
+            if kept[2] == moved[2] or moved in blamed:
+                continue
+            blamed.add(moved)
+            violations.append(violation(
+                'clash', moved[2], f"{teacher} teaches {kept[2]} and {moved[2]} on {day} {moved[3]}", day, moved[3]
+            ))
+
+    violations.sort(key=lambda record: order.get(record['class_group'], len(order)))
+    return violations
+
+
+def offending_class_groups(violations: list[dict], timetable_data: dict) -> list[str]:
+    """Class_groups to regenerate, in TimetableData order"""
+    offending = {record['class_group'] for record in violations}
+    return [class_group['name'] for class_group in timetable_data['class_groups'] if class_group['name'] in offending]